@@ -6,8 +6,49 @@ import subprocess
 import sys
 import importlib.machinery
 import re
+import hashlib
+import json
+import shutil
+import time
+import platform
+import types
+import ast
+import inspect
+import tempfile
+import threading
+import asyncio
+import functools
+import keyword
+import weakref
+import concurrent.futures
+import collections
 
 cppTemplate = """#include <vector>
+#include <cstddef>
+#include <cstdint>
+#include <cstdlib>
+#include <mutex>
+#include <new>
+#include <complex>
+#include <initializer_list>
+#include <algorithm>
+
+#if defined(_WIN32)
+#define NPCPP_LOCAL
+#else
+#define NPCPP_LOCAL __attribute__((visibility("hidden")))
+#endif
+
+// omp_set_num_threads only sets the count of the calling thread, so set_num_threads stores it for the
+// module and every entry point applies it to the thread calling it, defined in ompTemplate
+#ifdef _OPENMP
+#include <omp.h>
+#include <atomic>
+extern NPCPP_LOCAL std::atomic<int> npcpp_omp_threads;
+#define NPCPP_ENTER if (int npcpp_t = npcpp_omp_threads.load(std::memory_order_relaxed)) omp_set_num_threads(npcpp_t);
+#else
+#define NPCPP_ENTER
+#endif
 
 /* Compound C structure for vector imitation */
 //typedef struct {
@@ -18,56 +59,402 @@ cppTemplate = """#include <vector>
 template<typename T>
 struct vect {
     T* arr;
-    int size;
+    size_t size;
+    void* owner; // heap object holding arr when it was handed over to Python, nullptr otherwise
+    void (*release)(void*); // frees owner, called from Python when the numpy array is garbage collected
     // Default constructor to initialize members
-    vect() : arr(nullptr), size(0) {}
+    vect() : arr(nullptr), size(0), owner(nullptr), release(nullptr) {}
     // Constructor for convenience
-    vect(T* _arr, int _size) : arr(_arr), size(_size) {}
-    ~vect() {
-    }
+    vect(T* _arr, size_t _size) : arr(_arr), size(_size), owner(nullptr), release(nullptr) {}
+    // no user defined destructor: vect must stay trivially copyable to be passed by value through ctypes
 };
 
+template<typename T>
+void vect_release(void* owner)
+{
+    delete static_cast<std::vector<T>*>(owner);
+}
+
+template<typename T>
+void vect_release_array(void* owner)
+{
+    delete[] static_cast<T*>(owner);
+}
+
 template< typename T>
 vect<T> vec2arr (std::vector<T> vec)
 {
-    vect<T> out;
-    out.arr = new T[vec.size()];
-    out.size = vec.size();
-    //std::copy(vec.begin(), vec.end(), out);
-    //for(int i = 0; i < vec.size(); ++i)
-    for(typename std::vector<T>::size_type i = 0; i < vec.size(); ++i)
-        out.arr[i] = vec[i];
+    // the returned vector is moved to the heap and its buffer is given to numpy without copying
+    std::vector<T>* owner = new std::vector<T>(std::move(vec));
+    vect<T> out(owner->data(), owner->size());
+    out.owner = owner;
+    out.release = &vect_release<T>;
     return out;
 }
 
-template< typename T>
-vect<T> _vec2arr (std::vector<T> vec)
+inline vect<bool> vec2arr (std::vector<bool> vec)
 {
-    //vect out;
-    //out.arr = &vec[0];
-    //out.size = vec.size();
-    return {.arr = &vec[0], .size =  vec.size()};
+    // std::vector<bool> is bit packed, so it has to be unpacked into an owned bool array
+    bool* arr = new bool[vec.size()];
+    for(std::vector<bool>::size_type i = 0; i < vec.size(); ++i)
+        arr[i] = vec[i];
+    vect<bool> out(arr, vec.size());
+    out.owner = arr;
+    out.release = &vect_release_array<bool>;
+    return out;
 }
 
+// N-dimensional array exchanged with numpy without reshaping copies, strides are counted in elements
+// and may describe Fortran ordered or sliced (non contiguous) inputs, use a(i, j, ...) for element access
+#define NPCPP_MAXDIM 8
+template<typename T>
+struct ndarr {
+    T* arr;
+    size_t ndim;
+    size_t shape[NPCPP_MAXDIM];
+    ptrdiff_t strides[NPCPP_MAXDIM];
+    void* owner; // same ownership protocol as vect
+    void (*release)(void*);
+    ndarr() : arr(nullptr), ndim(0), shape(), strides(), owner(nullptr), release(nullptr) {}
+    // new C ordered array owned by the returned struct, its buffer is handed to numpy when returned
+    static ndarr<T> zeros(std::initializer_list<size_t> dims)
+    {
+        ndarr<T> out;
+        size_t n = 1;
+        for (size_t d : dims) {
+            out.shape[out.ndim++] = d;
+            n *= d;
+        }
+        ptrdiff_t stride = 1;
+        for (size_t k = out.ndim; k-- > 0;) {
+            out.strides[k] = stride;
+            stride *= out.shape[k];
+        }
+        std::vector<T>* owner = new std::vector<T>(n);
+        out.arr = owner->data();
+        out.owner = owner;
+        out.release = &vect_release<T>;
+        return out;
+    }
+    template<typename... I>
+    T& operator()(I... idx) const
+    {
+        ptrdiff_t offset = 0;
+        size_t k = 0;
+        ((offset += strides[k++] * static_cast<ptrdiff_t>(idx)), ...);
+        return arr[offset];
+    }
+    size_t size() const
+    {
+        size_t n = 1;
+        for (size_t k = 0; k < ndim; ++k)
+            n *= shape[k];
+        return n;
+    }
+    bool is_contiguous() const // C ordered without gaps
+    {
+        ptrdiff_t stride = 1;
+        for (size_t k = ndim; k-- > 0;) {
+            if (shape[k] != 1 && strides[k] != stride)
+                return false;
+            stride *= shape[k];
+        }
+        return true;
+    }
+};
+
+// non-owning read only view over a numpy buffer, exported functions taking npview<T> (or std::span<T> in C++20)
+// instead of std::vector<T> get the caller's data without the arr2vec copy
+template<typename T>
+struct npview {
+    const T* arr;
+    size_t n;
+    npview(const T* _arr, size_t _size) : arr(_arr), n(_size) {}
+    const T& operator[](size_t i) const { return arr[i]; }
+    const T* data() const { return arr; }
+    const T* begin() const { return arr; }
+    const T* end() const { return arr + n; }
+    size_t size() const { return n; }
+    bool empty() const { return n == 0; }
+};
+
 template<typename T>
 std::vector<T> arr2vec(const vect<T>& x) // Pass by const reference for efficiency and safety
 {
-    if (x.arr == nullptr || x.size <= 0) {
+    if (x.arr == nullptr || x.size == 0) {
         return std::vector<T>(); // Return an empty vector for invalid input
     }
     return std::vector<T>(x.arr, x.arr + x.size);
 }
 
+namespace npcpp {
+
+// bump allocator of a module: memory is carved from large blocks and given back all at once by reset(),
+// called from Python between batches, freeing the most recent allocation rewinds it, so scratch vectors
+// used stack-like inside a call do not grow the arena
+struct arena {
+    struct block { char* data; size_t size; };
+    std::vector<block> blocks;
+    size_t current = 0; // block being filled
+    size_t offset = 0; // bytes used in it
+    size_t in_use = 0; // bytes carved out since the last reset
+    size_t high_water = 0; // largest in_use since the library was loaded
+    size_t live = 0; // results handed over to numpy and not released yet
+    size_t block_size = 1 << 20;
+    std::mutex lock;
+    void* allocate(size_t n, size_t align)
+    {
+        std::lock_guard<std::mutex> guard(lock);
+        for (;;) {
+            if (current < blocks.size()) {
+                uintptr_t base = reinterpret_cast<uintptr_t>(blocks[current].data);
+                size_t start = ((base + offset + align - 1) & ~(uintptr_t)(align - 1)) - base;
+                if (start + n <= blocks[current].size) {
+                    in_use += start + n - offset;
+                    offset = start + n;
+                    high_water = std::max(high_water, in_use);
+                    return blocks[current].data + start;
+                }
+                ++current;
+                offset = 0;
+                if (current < blocks.size() && blocks[current].size >= n + align)
+                    continue;
+            }
+            size_t size = std::max(block_size, n + align);
+            char* data = static_cast<char*>(std::malloc(size));
+            if (!data)
+                throw std::bad_alloc();
+            blocks.insert(blocks.begin() + current, block{data, size});
+        }
+    }
+    void deallocate(void* p, size_t n)
+    {
+        std::lock_guard<std::mutex> guard(lock);
+        if (current < blocks.size() && static_cast<char*>(p) + n == blocks[current].data + offset) {
+            in_use -= n;
+            offset -= n;
+        }
+    }
+    // rewinds all blocks unless results are still used by numpy arrays, returns their number
+    size_t reset(bool release)
+    {
+        std::lock_guard<std::mutex> guard(lock);
+        if (live)
+            return live;
+        current = offset = in_use = 0;
+        if (release) {
+            for (block& b : blocks)
+                std::free(b.data);
+            blocks.clear();
+        }
+        return 0;
+    }
+    void reserve(size_t n)
+    {
+        std::lock_guard<std::mutex> guard(lock);
+        size_t reserved = 0;
+        for (block& b : blocks)
+            reserved += b.size;
+        if (reserved < n) {
+            char* data = static_cast<char*>(std::malloc(n - reserved));
+            if (!data)
+                throw std::bad_alloc();
+            blocks.push_back(block{data, n - reserved});
+        }
+    }
+};
+
+// one arena per library, defined in poolTemplate: the static of an inline function would become a unique
+// global symbol, which keeps the library loaded after dlclose
+NPCPP_LOCAL arena& pool();
+
+// caller's buffer of an out= call on this thread, set by out_scope in the _npcpp_out_ entries: the first
+// allocation of exactly its size is placed in it, so an npcpp::vector result is built where it is wanted
+struct out_buffer { void* data; size_t bytes; bool taken; };
+NPCPP_LOCAL out_buffer& out_target();
+
+struct out_scope {
+    out_buffer saved;
+    out_scope(void* data, size_t bytes) : saved(out_target()) { out_target() = out_buffer{data, bytes, false}; }
+    ~out_scope() { out_target() = saved; }
+};
+
+inline bool overlaps(const void* a, size_t na, const void* b, size_t nb)
+{
+    return static_cast<const char*>(a) < static_cast<const char*>(b) + nb && static_cast<const char*>(b) < static_cast<const char*>(a) + na;
+}
+
+template<typename T>
+struct pool_allocator {
+    typedef T value_type;
+    pool_allocator() noexcept {}
+    template<typename U> pool_allocator(const pool_allocator<U>&) noexcept {}
+    T* allocate(size_t n)
+    {
+        out_buffer& o = out_target();
+        if (o.data && !o.taken && n * sizeof(T) == o.bytes && reinterpret_cast<uintptr_t>(o.data) % alignof(T) == 0) {
+            o.taken = true;
+            return static_cast<T*>(o.data);
+        }
+        return static_cast<T*>(pool().allocate(n * sizeof(T), alignof(T)));
+    }
+    void deallocate(T* p, size_t n) noexcept
+    {
+        if (p != out_target().data) // the caller's buffer belongs to numpy
+            pool().deallocate(p, n * sizeof(T));
+    }
+};
+
+template<typename T, typename U>
+bool operator==(const pool_allocator<T>&, const pool_allocator<U>&) { return true; }
+
+template<typename T, typename U>
+bool operator!=(const pool_allocator<T>&, const pool_allocator<U>&) { return false; }
+
+// std::vector in the arena of the module, for results and scratch space without malloc/free per call
+template<typename T>
+using vector = std::vector<T, pool_allocator<T>>;
+
+}
+
+template<typename T>
+void pool_vector_release(void* owner)
+{
+    delete static_cast<npcpp::vector<T>*>(owner);
+    std::lock_guard<std::mutex> guard(npcpp::pool().lock);
+    --npcpp::pool().live;
+}
+
+template<typename T>
+vect<T> vec2arr (npcpp::vector<T> vec)
+{
+    // the buffer stays in the arena until numpy releases it, pool_reset waits for that
+    npcpp::vector<T>* owner = new npcpp::vector<T>(std::move(vec));
+    vect<T> out(owner->data(), owner->size());
+    out.owner = owner;
+    out.release = &pool_vector_release<T>;
+    std::lock_guard<std::mutex> guard(npcpp::pool().lock);
+    ++npcpp::pool().live;
+    return out;
+}
+
+inline vect<bool> vec2arr (npcpp::vector<bool> vec)
+{
+    return vec2arr(std::vector<bool>(vec.begin(), vec.end()));
+}
+
+template<typename T>
+npcpp::vector<T> arr2pool(const vect<T>& x)
+{
+    return npcpp::vector<T>(x.arr, x.arr + x.size);
+}
+
+"""
+
+# thread count of the module applied by NPCPP_ENTER, written into every library
+ompTemplate = """
+#ifdef _OPENMP
+NPCPP_LOCAL std::atomic<int> npcpp_omp_threads(0);
+#endif
+"""
+
+# thread count control written into every _ext.cpp, it is a no-op without options={'openmp': True}
+threadsTemplate = """
+DLLEXPORT void _set_num_threads(int n)
+{
+#ifdef _OPENMP
+    npcpp_omp_threads = n > 0 ? n : 0;
+    NPCPP_ENTER
+#endif
+}
+
+DLLEXPORT int _get_num_threads()
+{
+#ifdef _OPENMP
+    int n = npcpp_omp_threads;
+    return n ? n : omp_get_max_threads();
+#else
+    return 1;
+#endif
+}
+"""
+
+# copies a result handed over by vec2arr into a numpy buffer and frees it, used by fast calls (see fast_call)
+releaseTemplate = """
+#include <cstring>
+
+DLLEXPORT void _npcpp_take(void* dst, const void* src, size_t nbytes, void* owner, void (*release)(void*))
+{
+    if (nbytes)
+        std::memcpy(dst, src, nbytes);
+    if (owner)
+        release(owner);
+}
+"""
+
+# profile counters of a library built with options={'pgo': 'generate'} are written by gcov at exit,
+# pgo writes them right after the workload through this entry
+pgoTemplate = """
+#ifdef NPCPP_PGO_GENERATE
+extern "C" void __gcov_dump(void);
+extern "C" void __gcov_reset(void);
+
+DLLEXPORT void _npcpp_gcov_dump()
+{
+    __gcov_dump();
+    __gcov_reset();
+}
+#endif
+"""
+
+# arena of npcpp::vector written into every library, see pool_functions
+poolTemplate = """
+npcpp::arena& npcpp::pool()
+{
+    static npcpp::arena a;
+    return a;
+}
+
+npcpp::out_buffer& npcpp::out_target()
+{
+    static thread_local npcpp::out_buffer b = {nullptr, 0, false};
+    return b;
+}
+
+DLLEXPORT size_t _npcpp_pool_reset(int release)
+{
+    return npcpp::pool().reset(release != 0);
+}
+
+DLLEXPORT void _npcpp_pool_reserve(size_t nbytes)
+{
+    npcpp::pool().reserve(nbytes);
+}
+
+DLLEXPORT void _npcpp_pool_stats(size_t* out)
+{
+    npcpp::arena& a = npcpp::pool();
+    std::lock_guard<std::mutex> guard(a.lock);
+    out[0] = a.in_use;
+    out[1] = a.high_water;
+    out[2] = 0;
+    for (const npcpp::arena::block& b : a.blocks)
+        out[2] += b.size;
+    out[3] = a.live;
+    out[4] = a.blocks.size();
+}
 """
 
 class compiler():
 
-    def __init__(self, path):
+    def __init__(self, path=None, profile='release', options=None):
         self.PATH = path
         self.SYS_TYPE = getSystem()
+        self.PROFILE = profile
+        self.OPTIONS = options
 
     def makelib(self, name, sys_type=None):
-        return makelib(name, sys_type=sys_type, alt_path=self.PATH)
+        return makelib(name, sys_type=sys_type, alt_path=self.PATH, profile=self.PROFILE, options=self.OPTIONS)
     
     def loadlib(name,sys_type=None):
         return loadlib(name,sys_type=sys_type)
@@ -75,140 +462,813 @@ class compiler():
     def deloadlib(self, namespace, sys_type=None, handle_custom=None):
         return deloadlib(namespace,sys_type=sys_type,handle_custom=handle_custom)
     
-    def sourceCpp(self, name, recompile=True):
-        return sourceCpp(name, recompile=recompile, alt_path=self.PATH)
+    def sourceCpp(self, name, recompile=True, cache=True):
+        return sourceCpp(name, recompile=recompile, alt_path=self.PATH, cache=cache, profile=self.PROFILE, options=self.OPTIONS)
+
+    def sourceCppSimple(self, name, recompile=True, cache=True):
+        return sourceCppSimple(name, recompile=recompile, alt_path=self.PATH, cache=cache, profile=self.PROFILE, options=self.OPTIONS)
+
+    def cppFunction(self, code, cache=True):
+        return cppFunction(code, alt_path=self.PATH, cache=cache, profile=self.PROFILE, options=self.OPTIONS)
+
+    def acppFunction(self, code, cache=True):
+        return acppFunction(code, alt_path=self.PATH, cache=cache, profile=self.PROFILE, options=self.OPTIONS)
+
+    def asourceCpp(self, name, recompile=True, cache=True):
+        return asourceCpp(name, recompile=recompile, alt_path=self.PATH, cache=cache, profile=self.PROFILE, options=self.OPTIONS)
+
+    def pgo(self, name, workload=None, module=None, store=None, refresh=False):
+        return pgo(name, workload, module=module, store=store, refresh=refresh, alt_path=self.PATH, profile=self.PROFILE, options=self.OPTIONS)
+
+_release_t = ctypes.CFUNCTYPE(None, ctypes.c_void_p)
+
+# libraries by handle which numpy arrays over buffers they handed over (or ufuncs) still use, as
+# [CDLL, number of users, unload requested by deloadlib], see pin_library
+_pinned = {}
+_pinned_lock = threading.Lock()
+
+def pin_library(lib):
+    """Keep lib loaded for one more user, deloadlib only frees it once every user called unpin_library"""
+    with _pinned_lock:
+        entry = _pinned.setdefault(lib._handle, [lib, 0, False])
+        entry[1] += 1
+
+def unpin_library(lib):
+    """Drop one user of lib, freeing it when it is the last one and deloadlib was called meanwhile"""
+    with _pinned_lock:
+        entry = _pinned[lib._handle]
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del _pinned[lib._handle]
+    if entry[2]:
+        free_library(lib._handle)
 
-    def sourceCppSimple(self, name, recompile=True):
-        return sourceCppSimple(name, recompile=recompile, alt_path=self.PATH)
+def result_type(lib, restype):
+    """Subclass of a vect/ndarr structure restype whose results remember lib, other types as they are"""
+    if not (isinstance(restype, type) and issubclass(restype, (vect, ndarr))):
+        return restype
+    cache = lib.__dict__.setdefault('_npcpp_result_types', {})
+    if restype not in cache:
+        cache[restype] = type(restype.__name__, (restype,), {'_lib': lib})
+    return cache[restype]
 
-    def cppFunction(self, code):
-        return cppFunction(code, alt_path=self.PATH)
+def release_result(lib, release, owner):
+    _release_t(release)(owner)
+    unpin_library(lib)
 
-class vecti(ctypes.Structure):
+def hand_over(buf, res):
+    """Call the release function of the C++ result res once buf (and every numpy view of it) is garbage
+    collected, the library of the release function stays loaded until then"""
+    if res._lib is None:
+        weakref.finalize(buf, _release_t(res.release), res.owner)
+        return
+    pin_library(res._lib)
+    weakref.finalize(buf, release_result, res._lib, res.release, res.owner)
+
+def vect2np(v):
+    """Numpy array over the buffer of a vect returned from C++
+
+    When C++ handed over ownership (vec2arr) the buffer is not copied, its release function is called
+    once the array and all views of it are garbage collected, otherwise a copy is made
+    """
+    ctype = v._fields_[0][1]._type_
+    if v.size <= 0 or not v.arr:
+        if v.owner:
+            _release_t(v.release)(v.owner)
+        return np.empty(0, dtype=v._dtype)
+    buf = (ctype * v.size).from_address(ctypes.addressof(v.arr.contents))
+    if v.owner:
+        # numpy views keep the ctypes buffer as their base, so it is the object tracked for release
+        hand_over(buf, v)
+        return np.frombuffer(buf, dtype=v._dtype)
+    return np.frombuffer(buf, dtype=v._dtype).copy()
+
+def np2vect(cls, a):
+    """vect structure over a contiguous array of the structure element type, converting (copying) a only when needed"""
+    a_c = np.ascontiguousarray(a, dtype=cls._dtype) #due to different length of int64 and c_int
+    instance = cls(a_c.ctypes.data_as(cls._fields_[0][1]), len(a_c))
+    # Store a reference to the numpy array instance to keep it alive
+    instance._numpy_ref = a_c
+    return instance
+
+def np2view(cls, a):
+    """vect structure over the buffer of a without any conversion, for npview<>/std::span<> parameters"""
+    if not isinstance(a, np.ndarray) or a.dtype != cls._dtype:
+        raise TypeError("View argument must be a numpy array of dtype %s, got %s" % (cls._dtype, getattr(a, 'dtype', type(a).__name__)))
+    if a.ndim != 1 or not a.flags.c_contiguous:
+        raise ValueError("View argument must be a contiguous 1-d array, use np.ascontiguousarray to copy it first")
+    instance = cls(a.ctypes.data_as(cls._fields_[0][1]), a.shape[0])
+    instance._numpy_ref = a
+    return instance
+
+class c_complex_float(ctypes.Structure):
+    """layout of std::complex<float>"""
+    _fields_ = [('real', ctypes.c_float), ('imag', ctypes.c_float)]
+
+class c_complex_double(ctypes.Structure):
+    """layout of std::complex<double>"""
+    _fields_ = [('real', ctypes.c_double), ('imag', ctypes.c_double)]
+
+def vect_fields(ctype):
     #np.ctypeslib.ndpointer(dtype=ctypes.c_double, shape=(n,))    
-    #_fields_ = [('arr', ctypes.c_void_p), ('size', ctypes.c_int)]
-    _fields_ = [('arr', ctypes.POINTER(ctypes.c_int)), ('size', ctypes.c_int)]
+    return [('arr', ctypes.POINTER(ctype)), ('size', ctypes.c_size_t),
+            ('owner', ctypes.c_void_p), ('release', ctypes.c_void_p)]
+
+class vect(ctypes.Structure):
+    """Base of the ctypes mirrors of C++ vect<T>, subclasses set _fields_ (see vect_fields) and numpy _dtype"""
     # Add a slot to store the reference to the original numpy array  
-    _numpy_ref = None 
-    def __repr__(self):
-        return '({0}, {1})'.format(self.arr, self.size)       
-    @classmethod
-    def fromnp(cls, a):
-        # Create a contiguous copy that will own the memory
-        a_c = np.ascontiguousarray(a, dtype=ctypes.c_int) #due to different length of int64 and c_int
-        # Create the instance
-        instance = cls(a_c.ctypes.data_as(ctypes.POINTER(ctypes.c_int)), len(a_c))
-        # FIX: Store a reference to the numpy array instance to keep it alive
-        instance._numpy_ref = a_c 
-        return instance
-    @classmethod
-    def li(cls,l):
-        return cls((ctypes.c_int * len(l))(*l),len(l))
-    def tonp(cls):
-        return np.array(cls.arr[0:cls.size])   
-    
-class vectd(ctypes.Structure):
-    _fields_ = [('arr', ctypes.POINTER(ctypes.c_double)), ('size', ctypes.c_int)]
+    _numpy_ref = None
+    # library of results, see result_type
+    _lib = None
     def __repr__(self):
         return '({0}, {1})'.format(self.arr, self.size)       
     @classmethod
     def fromnp(cls, a):
-        return cls(a.ctypes.data_as(ctypes.POINTER(ctypes.c_double)),len(a))
-    @classmethod
-    def li(cls,l):
-        return cls((ctypes.c_double * len(l))(*l),len(l))
-    def tonp(cls):
-        return np.array(cls.arr[0:cls.size])
-   
-class vectb(ctypes.Structure):
-    _fields_ = [('arr', ctypes.POINTER(ctypes.c_bool)), ('size', ctypes.c_int)]
-    def __repr__(self):
-        return '({0}, {1})'.format(self.arr, self.size)       
+        return np2vect(cls, a)
     @classmethod
-    def fromnp(cls, a):
-        return cls(a.ctypes.data_as(ctypes.POINTER(ctypes.c_bool)),len(a))
+    def asview(cls, a):
+        return np2view(cls, a)
     @classmethod
     def li(cls,l):
-        return cls((ctypes.c_bool * len(l))(*l),len(l))
+        return np2vect(cls, np.array(l, dtype=cls._dtype))
     def tonp(cls):
-        return np.array(cls.arr[0:cls.size])    
+        return vect2np(cls)
+
+class vecti(vect):
+    """int"""
+    _fields_ = vect_fields(ctypes.c_int)
+    _dtype = np.dtype(np.intc)
+
+class vectd(vect):
+    """double"""
+    _fields_ = vect_fields(ctypes.c_double)
+    _dtype = np.dtype(np.float64)
+
+class vectb(vect):
+    """bool"""
+    _fields_ = vect_fields(ctypes.c_bool)
+    _dtype = np.dtype(np.bool_)
+
+class vectll(vect):
+    """long long"""
+    _fields_ = vect_fields(ctypes.c_longlong)
+    _dtype = np.dtype(np.longlong)
+
+class vectf(vect):
+    """float"""
+    _fields_ = vect_fields(ctypes.c_float)
+    _dtype = np.dtype(np.float32)
+
+class vectl(vect):
+    """long"""
+    _fields_ = vect_fields(ctypes.c_long)
+    _dtype = np.dtype(np.dtype(ctypes.c_long))
+
+class vectsh(vect):
+    """short"""
+    _fields_ = vect_fields(ctypes.c_short)
+    _dtype = np.dtype(np.int16)
 
-class vectll(ctypes.Structure):
-    _fields_ = [('arr', ctypes.POINTER(ctypes.c_longlong)), ('size', ctypes.c_int)]
+class vectc(vect):
+    """int8_t"""
+    _fields_ = vect_fields(ctypes.c_int8)
+    _dtype = np.dtype(np.int8)
+
+class vectuc(vect):
+    """uint8_t"""
+    _fields_ = vect_fields(ctypes.c_uint8)
+    _dtype = np.dtype(np.uint8)
+
+class vectus(vect):
+    """uint16_t"""
+    _fields_ = vect_fields(ctypes.c_uint16)
+    _dtype = np.dtype(np.uint16)
+
+class vectui(vect):
+    """uint32_t"""
+    _fields_ = vect_fields(ctypes.c_uint32)
+    _dtype = np.dtype(np.uint32)
+
+class vectull(vect):
+    """uint64_t"""
+    _fields_ = vect_fields(ctypes.c_uint64)
+    _dtype = np.dtype(np.uint64)
+
+class vectul(vect):
+    """unsigned long"""
+    _fields_ = vect_fields(ctypes.c_ulong)
+    _dtype = np.dtype(np.dtype(ctypes.c_ulong))
+
+class vectcf(vect):
+    """std::complex<float>"""
+    _fields_ = vect_fields(c_complex_float)
+    _dtype = np.dtype(np.complex64)
+
+class vectcd(vect):
+    """std::complex<double>"""
+    _fields_ = vect_fields(c_complex_double)
+    _dtype = np.dtype(np.complex128)
+
+NDARR_MAXDIM = 8 # NPCPP_MAXDIM of cppTemplate
+
+def ndarr_fields(ctype):
+    return [('arr', ctypes.POINTER(ctype)), ('ndim', ctypes.c_size_t),
+            ('shape', ctypes.c_size_t * NDARR_MAXDIM), ('strides', ctypes.c_ssize_t * NDARR_MAXDIM),
+            ('owner', ctypes.c_void_p), ('release', ctypes.c_void_p)]
+
+class ndarr(ctypes.Structure):
+    """Base of the ctypes mirrors of C++ ndarr<T>, N-d arrays passed with their shape and strides"""
+    _numpy_ref = None
+    _lib = None
     def __repr__(self):
-        return '({0}, {1})'.format(self.arr, self.size)       
+        return '({0}, {1})'.format(self.arr, tuple(self.shape[0:self.ndim]))
     @classmethod
     def fromnp(cls, a):
-        return cls(a.ctypes.data_as(ctypes.POINTER(ctypes.c_longlong)),len(a))
+        """Struct over the buffer of a keeping its layout (Fortran order, slices), a copy is made only to convert the dtype"""
+        a = np.asarray(a)
+        if a.dtype != cls._dtype or any(st % a.itemsize for st in a.strides):
+            a = np.ascontiguousarray(a, dtype=cls._dtype)
+        if a.ndim > NDARR_MAXDIM:
+            raise ValueError("ndarr supports at most %d dimensions, got %d" % (NDARR_MAXDIM, a.ndim))
+        instance = cls()
+        instance.arr = a.ctypes.data_as(cls._fields_[0][1])
+        instance.ndim = a.ndim
+        for k in range(a.ndim):
+            instance.shape[k] = a.shape[k]
+            instance.strides[k] = a.strides[k] // a.itemsize
+        instance._numpy_ref = a
+        return instance
     @classmethod
-    def li(cls,l):
-        return cls((ctypes.c_longlong * len(l))(*l),len(l))
+    def asview(cls, a):
+        return cls.fromnp(a)
     def tonp(cls):
-        return np.array(cls.arr[0:cls.size]) 
+        """Numpy array with the shape and strides of the struct, zero copy when C++ handed over ownership"""
+        shape = tuple(cls.shape[0:cls.ndim])
+        strides = tuple(cls.strides[k]*cls._dtype.itemsize for k in range(cls.ndim))
+        if not cls.arr or 0 in shape:
+            if cls.owner:
+                _release_t(cls.release)(cls.owner)
+            return np.empty(shape, dtype=cls._dtype)
+        # span of the buffer in elements, from the lowest to the highest addressed element
+        low = sum(st*(n-1) for st, n in zip(cls.strides[0:cls.ndim], shape) if st < 0)
+        high = sum(st*(n-1) for st, n in zip(cls.strides[0:cls.ndim], shape) if st > 0)
+        ctype = cls._fields_[0][1]._type_
+        buf = (ctype * (high-low+1)).from_address(ctypes.addressof(cls.arr.contents)+low*cls._dtype.itemsize)
+        out = np.ndarray(shape, dtype=cls._dtype, buffer=buf, offset=-low*cls._dtype.itemsize, strides=strides)
+        if cls.owner:
+            hand_over(buf, cls)
+            return out
+        return out.copy()
+
+class ndarrd(ndarr):
+    _fields_ = ndarr_fields(vectd._fields_[0][1]._type_)
+    _dtype = vectd._dtype
+
+class ndarrf(ndarr):
+    _fields_ = ndarr_fields(vectf._fields_[0][1]._type_)
+    _dtype = vectf._dtype
+
+class ndarri(ndarr):
+    _fields_ = ndarr_fields(vecti._fields_[0][1]._type_)
+    _dtype = vecti._dtype
+
+class ndarrl(ndarr):
+    _fields_ = ndarr_fields(vectl._fields_[0][1]._type_)
+    _dtype = vectl._dtype
+
+class ndarrll(ndarr):
+    _fields_ = ndarr_fields(vectll._fields_[0][1]._type_)
+    _dtype = vectll._dtype
+
+class ndarrsh(ndarr):
+    _fields_ = ndarr_fields(vectsh._fields_[0][1]._type_)
+    _dtype = vectsh._dtype
+
+class ndarrc(ndarr):
+    _fields_ = ndarr_fields(vectc._fields_[0][1]._type_)
+    _dtype = vectc._dtype
+
+class ndarruc(ndarr):
+    _fields_ = ndarr_fields(vectuc._fields_[0][1]._type_)
+    _dtype = vectuc._dtype
+
+class ndarrus(ndarr):
+    _fields_ = ndarr_fields(vectus._fields_[0][1]._type_)
+    _dtype = vectus._dtype
+
+class ndarrui(ndarr):
+    _fields_ = ndarr_fields(vectui._fields_[0][1]._type_)
+    _dtype = vectui._dtype
+
+class ndarrull(ndarr):
+    _fields_ = ndarr_fields(vectull._fields_[0][1]._type_)
+    _dtype = vectull._dtype
+
+class ndarrul(ndarr):
+    _fields_ = ndarr_fields(vectul._fields_[0][1]._type_)
+    _dtype = vectul._dtype
+
+class ndarrcf(ndarr):
+    _fields_ = ndarr_fields(vectcf._fields_[0][1]._type_)
+    _dtype = vectcf._dtype
+
+class ndarrcd(ndarr):
+    _fields_ = ndarr_fields(vectcd._fields_[0][1]._type_)
+    _dtype = vectcd._dtype
+
+class ndarrb(ndarr):
+    _fields_ = ndarr_fields(vectb._fields_[0][1]._type_)
+    _dtype = vectb._dtype
+
+# C++ element type spellings (after 'long long' -> 'longlong') and the structure they travel in
+VECT_ELEMENTS = {
+    'double': 'vectd', 'float': 'vectf', 'int': 'vecti', 'int32_t': 'vecti', 'long': 'vectl',
+    'longlong': 'vectll', 'int64_t': 'vectll', 'short': 'vectsh', 'int16_t': 'vectsh', 'char': 'vectc', 'int8_t': 'vectc',
+    'uint8_t': 'vectuc', 'uint16_t': 'vectus', 'unsigned': 'vectui', 'uint32_t': 'vectui', 'uint64_t': 'vectull', 'size_t': 'vectull',
+    'unsignedlong': 'vectul',
+    'bool': 'vectb', 'std::complex<float>': 'vectcf', 'complex<float>': 'vectcf',
+    'std::complex<double>': 'vectcd', 'complex<double>': 'vectcd'}
 
 def wrap_function(lib, funcname, restype, argtypes):
     """Simplify wrapping ctypes functions"""
     func = lib.__getattr__(funcname)
-    func.restype = restype
+    func.restype = result_type(lib, restype)
     func.argtypes = argtypes
     return func
 
-def makelib(name,sys_type=None,alt_path=None):
-    pathfilename = os.path.join(os.getcwd(), name)
+# named optimization profiles, 'none' reproduces plain g++ calls without any -O level
+PROFILES = {
+    'none': [],
+    'debug': ['-O0', '-g'],
+    'release': ['-O3', '-DNDEBUG'],
+    'native': ['-O3', '-DNDEBUG', '-march=native'],
+}
+
+# settings of exports marked '//npcpp::export parallel', see set_parallel
+PARALLEL = {'threads': None, 'chunk_size': None, 'min_size': 100000}
+_pool = {}
+
+def set_parallel(threads=None, chunk_size=None, min_size=None):
+    """Configure parallel exports: number of threads (default all cores), elements per chunk (default
+    an even split between threads) and the input size below which the call runs serially"""
+    if threads is not None:
+        PARALLEL['threads'] = threads
+    if chunk_size is not None:
+        PARALLEL['chunk_size'] = chunk_size
+    if min_size is not None:
+        PARALLEL['min_size'] = min_size
+    return dict(PARALLEL)
+
+def _executor(threads):
+    if _pool.get('threads') != threads:
+        if 'executor' in _pool:
+            _pool['executor'].shutdown(wait=False)
+        _pool['executor'] = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+        _pool['threads'] = threads
+    return _pool['executor']
+
+def parallel_map(func, args, positions, argtypes, restype):
+    """Call an elementwise export over chunks of its vector arguments on a thread pool
+
+    ctypes releases the GIL during the native call, so chunks run concurrently, positions are the
+    1-based indices of vector arguments in args, chunk results are written into one preallocated array
+    """
+    arrays = {}
+    for p in positions:
+        arrays[p] = np.ascontiguousarray(args[p-1], dtype=argtypes[p-1]._dtype)
+    n = len(arrays[positions[0]])
+    if any(len(a) != n for a in arrays.values()):
+        raise ValueError("Parallel export requires all vector arguments to have the same length.")
+    threads = PARALLEL['threads'] or os.cpu_count() or 1
+    def call(lo, hi):
+        cargs = list(args)
+        for p in positions:
+            cargs[p-1] = argtypes[p-1].asview(arrays[p][lo:hi])
+        return func(*cargs).tonp()
+    if n < PARALLEL['min_size'] or threads <= 1:
+        return call(0, n)
+    chunk = PARALLEL['chunk_size'] or -(-n // threads)
+    out = np.empty(n, dtype=restype._dtype)
+    def run(lo):
+        hi = min(lo+chunk, n)
+        res = call(lo, hi)
+        if len(res) != hi-lo:
+            raise ValueError("Parallel export must return one element per input element, got %d for %d." % (len(res), hi-lo))
+        out[lo:hi] = res
+    list(_executor(threads).map(run, range(0, n, chunk)))
+    return out
+
+# streaming runs read inputs in chunks of about chunk_bytes bytes unless a chunk_size (rows) is given
+STREAM = {'chunk_bytes': 1 << 24}
+
+def npy_header(f):
+    """shape, fortran order, dtype and data offset of the .npy file f opened for reading"""
+    if np.lib.format.read_magic(f) == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    return shape, fortran, dtype, f.tell()
+
+def stream_source(source, dtype=None):
+    """Array to stream from: np.memmap/ndarray as they are, a .npy path as (path, data offset, dtype, shape)
+    read piece by piece, any other path as a raw binary file of dtype"""
+    if not isinstance(source, str):
+        return source if isinstance(source, np.ndarray) else np.asarray(source)
+    if source.endswith('.npy'):
+        with open(source, 'rb') as f:
+            shape, fortran, file_dtype, offset = npy_header(f)
+        if fortran and len(shape) > 1:
+            raise ValueError("Cannot stream rows of the Fortran ordered array in %s" % source)
+        return (source, offset, file_dtype, shape)
+    if dtype is None:
+        raise ValueError("dtype is needed to stream the raw binary file %s" % source)
+    dtype = np.dtype(dtype)
+    return (source, 0, dtype, (os.path.getsize(source)//dtype.itemsize,))
+
+def stream_length(source):
+    return len(source) if isinstance(source, np.ndarray) else source[3][0]
+
+def stream_chunks(source, chunk_size):
+    """Generator of consecutive row chunks of a source from stream_source, files are read chunk by chunk
+    so only one chunk is in memory at a time"""
+    if isinstance(source, np.ndarray):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start+chunk_size]
+        return
+    path, offset, dtype, shape = source
+    row = int(np.prod(shape[1:], dtype=np.int64))
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for start in range(0, shape[0], chunk_size):
+            rows = min(chunk_size, shape[0]-start)
+            yield np.fromfile(f, dtype=dtype, count=rows*row).reshape((rows,)+tuple(shape[1:]))
+
+def stream_target(out, res, n):
+    """Create the .npy or raw output file out for n rows like res, returns the offset of its data"""
+    if out.endswith('.npy'):
+        np.lib.format.open_memmap(out, mode='w+', dtype=res.dtype, shape=(n,)+res.shape[1:]).flush()
+        with open(out, 'rb') as f:
+            return npy_header(f)[3]
+    with open(out, 'wb') as f:
+        f.truncate(n*(res.nbytes//max(len(res), 1)))
+    return 0
+
+def stream_write(out, offset, start, res):
+    """Write the result of a chunk to rows start.. of out, an array or a file mapped only for these rows"""
+    if not isinstance(out, str):
+        out[start:start+len(res)] = res
+    elif len(res):
+        part = np.memmap(out, dtype=res.dtype, mode='r+', offset=offset+start*(res.nbytes//len(res)), shape=res.shape)
+        part[:] = res
+        part.flush()
+        del part
+
+def stream(module, name, inputs, out=None, chunk_size=None, dtype=None, args=(), init_args=()):
+    """Run an export over inputs larger than memory, chunk by chunk
+
+    inputs is one or a list of np.memmap/arrays or .npy/raw binary paths (raw files need dtype) of equal length,
+    name is an export of module (or a callable) called as name(*chunks, *args) for every chunk of rows.
+    When module has no export name but name_init, name_step and name_finish, a state is carried between chunks:
+    state = name_init(*init_args), name_step(state, *chunks, *args) per chunk, name_finish(state) at the end.
+    Results of the calls (same number of rows as the chunk) are written to out, an array or a .npy/raw path,
+    so peak memory stays at a few chunks. Returns out (a memmap for paths, of n rows shaped like the results
+    also for raw files) or the result of name_finish.
+    """
+    if not isinstance(inputs, (list, tuple)):
+        inputs = [inputs]
+    sources = [stream_source(x, dtype) for x in inputs]
+    n = stream_length(sources[0])
+    if [s for s in sources if stream_length(s) != n]:
+        raise ValueError("Streamed inputs must have the same length, got %s" % [stream_length(s) for s in sources])
+    init = step = finish = None
+    if callable(name):
+        step = name
+    elif hasattr(module, name):
+        step = getattr(module, name)
+    elif all(hasattr(module, name+suffix) for suffix in ('_init', '_step', '_finish')):
+        init, step, finish = [getattr(module, name+suffix) for suffix in ('_init', '_step', '_finish')]
+    else:
+        raise ValueError("Module has neither an export '%s' nor '%s_init', '%s_step' and '%s_finish'" % (name, name, name, name))
+    if chunk_size is None:
+        row_bytes = 0
+        for s in sources:
+            shape, item = (s.shape, s.dtype.itemsize) if isinstance(s, np.ndarray) else (s[3], s[2].itemsize)
+            row_bytes += item*int(np.prod(shape[1:], dtype=np.int64))
+        chunk_size = max(1, STREAM['chunk_bytes']//max(row_bytes, 1))
+    state = init(*init_args) if init is not None else None
+    offset = None
+    try:
+        start = 0
+        for chunks in zip(*[stream_chunks(s, chunk_size) for s in sources]):
+            res = step(*((state,) if init is not None else ())+chunks+tuple(args))
+            if out is not None and res is not None:
+                res = np.asarray(res)
+                if len(res) != len(chunks[0]):
+                    raise ValueError("Streaming writes one result row per input row, the chunk of %d rows gave %d" % (len(chunks[0]), len(res)))
+                if offset is None:
+                    offset = stream_target(out, res, n) if isinstance(out, str) else 0
+                stream_write(out, offset, start, res)
+            start += len(chunks[0])
+    except BaseException:
+        if finish is not None:
+            finish(state) # frees the state, the result is dropped
+        raise
+    if finish is not None:
+        return finish(state)
+    if isinstance(out, str) and offset is not None:
+        if out.endswith('.npy'):
+            return np.load(out, mmap_mode='r')
+        # a raw file has no header, its rows get the shape of the results again
+        return np.memmap(out, mode='r', dtype=res.dtype, shape=(n,)+res.shape[1:])
+    return out
+
+def build_flags(sys_type=None, profile='release', options=None):
+    """Compile flags passed to g++, they are also part of the build cache key
+
+    options is a dict with optional keys: flags (extra compile flags), defines (dict or list of NAME/NAME=VALUE),
+    include_dirs, fast_math (adds -ffast-math), openmp (adds -fopenmp to compile and link),
+    time_report (adds -ftime-report, its output goes to the build report), pgo ('generate' or 'use' with the
+    profile data directory pgo_profile, see pgo), see also link_flags for the link step keys
+    """
     if sys_type is None:
-        sys_type = getSystem()    
+        sys_type = getSystem()
+    if profile not in PROFILES:
+        raise ValueError("Unknown build profile '%s', available: %s" % (profile, ', '.join(sorted(PROFILES))))
+    options = options or {}
     if sys_type==0:
-        shell = "cmd.exe"
-        if alt_path is not None:
-            mingw_bin_path = alt_path
-        else:
-            mingw_bin_path = r"C:\RBuildTools\rtools42\x86_64-w64-mingw32.static.posix\bin"
-            if not os.path.isdir(mingw_bin_path):
-                mingw_bin_path = r"C:\Program Files (x86)\Embarcadero\Dev-Cpp\TDM-GCC-64\bin"
-            else:
-                print("Compilation failed. Default mingw directories don't exist and alternative path was not provided.")
-                return 1
-        custom_env = os.environ.copy() # Start with a copy of the current environment
-        if mingw_bin_path:
-            # Add mingw_bin_path to the PATH for the subprocess
-            # Prepend it to ensure it's found before any conflicting tools
-            # IMPORTANT: Use os.pathsep (;) for separator on Windows
-            #custom_env['PATH'] = f"{mingw_bin_path}{os.pathsep}{custom_env.get('PATH', '')}"
-            custom_env['PATH'] = "{}{}{}".format(mingw_bin_path, os.pathsep, custom_env.get('PATH', ''))
-        # Chain all commands with ' & '
-        command1 = r'g++.exe -c "'+pathfilename+'.cpp" -o "'+pathfilename+'.o" -Wall -std=c++17'
-        command2 = r'g++.exe -shared -o "'+pathfilename+'.dll" "'+pathfilename+'.o"'
-        commands_list = [command1,command2]    
-        full_command_string = " & ".join(commands_list)
-    
-        # Use cmd /C to execute the command string in a new cmd instance
-        cmd_prefix = "{} /C".format(shell) if shell == "cmd.exe" else shell
-        final_command = '{0} "{1}"'.format(cmd_prefix, full_command_string) # The command string to pass to subprocess.run
-    
+        flags = ['-Wall', '-std=c++17']
+    else:
+        flags = ['-fPIC']
+    flags += PROFILES[profile]
+    if options.get('fast_math'):
+        flags.append('-ffast-math')
+    if options.get('openmp'):
+        flags.append('-fopenmp')
+    if options.get('time_report'):
+        flags.append('-ftime-report')
+    if options.get('pgo') == 'generate':
+        flags += ['-fprofile-generate', '-fprofile-update=atomic', '-DNPCPP_PGO_GENERATE']
+    elif options.get('pgo') == 'use':
+        flags += ['-fprofile-use', '-fprofile-correction', '-Wno-missing-profile']
+    defines = options.get('defines') or []
+    if isinstance(defines, dict):
+        defines = [k if v is None else '{0}={1}'.format(k, v) for k, v in sorted(defines.items())]
+    flags += ['-D'+d for d in defines]
+    flags += ['-I'+d for d in options.get('include_dirs') or []]
+    flags += list(options.get('flags') or [])
+    return flags
+
+def link_flags(sys_type=None, profile='release', options=None):
+    """Flags of the shared library link step: options keys lib_dirs, libs (names without -l) and link_flags"""
+    options = options or {}
+    flags = ['-shared']
+    if options.get('fast_math'):
+        flags.append('-ffast-math')
+    if options.get('openmp'):
+        flags.append('-fopenmp')
+    if options.get('pgo') == 'generate':
+        flags.append('-fprofile-generate')
+    flags += ['-L'+d for d in options.get('lib_dirs') or []]
+    flags += ['-l'+l for l in options.get('libs') or []]
+    flags += list(options.get('link_flags') or [])
+    return flags
+
+def record_build(libfile, profile, compile_flags, lflags):
+    """Save how libfile was compiled next to it as libfile.json, see build_info"""
+    with open(libfile+'.json', 'w') as f:
+        json.dump({'profile': profile, 'compile_flags': compile_flags, 'link_flags': lflags,
+                   'built': time.time()}, f)
+
+def build_info(name, sys_type=None):
+    """Return the profile and flags recorded for the library last built from source file name"""
+    path = _builds.get(os.path.abspath(lib_basename(name)), lib_basename(name)+'_ext'+libext(sys_type)+'.json')
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def find_mingw(alt_path=None):
+    """Return mingw bin directory: alt_path if given, else the first default dir that exists"""
+    if alt_path is not None:
+        return alt_path
+    for mingw_bin_path in (r"C:\RBuildTools\rtools42\x86_64-w64-mingw32.static.posix\bin",
+                           r"C:\Program Files (x86)\Embarcadero\Dev-Cpp\TDM-GCC-64\bin"):
+        if os.path.isdir(mingw_bin_path):
+            return mingw_bin_path
+    return None
+
+def compiler_env(sys_type=None, alt_path=None):
+    """g++ executable and environment to run it with, (None, None) when mingw is not found
+
+    On Windows the full path of g++.exe is returned: CreateProcess looks the executable up in the PATH of
+    the parent process, the mingw directory is added to the PATH of g++ only for the tools it runs itself
+    """
+    if sys_type is None:
+        sys_type = getSystem()
+    if sys_type!=0:
+        return 'g++', None
+    mingw_bin_path = find_mingw(alt_path)
+    if mingw_bin_path is None:
+        return None, None
+    custom_env = os.environ.copy()
+    custom_env['PATH'] = "{}{}{}".format(mingw_bin_path, os.pathsep, custom_env.get('PATH', ''))
+    return os.path.join(mingw_bin_path, 'g++.exe'), custom_env
+
+# g++ diagnostics: path:line:column: kind: message
+DIAGNOSTIC = re.compile(r'^(.*?):(\d+):(?:(\d+):)? (warning|error|fatal error): (.*)$', re.MULTILINE)
+_report_lock = threading.Lock()
+
+# hook is called with the report of every sourceCpp/cppFunction build, see set_build_hook
+BUILD = {'hook': None}
+
+def set_build_hook(hook):
+    """hook(report) is called with the build report (see new_report) of every sourceCpp/cppFunction call, None removes it"""
+    BUILD['hook'] = hook
+
+def new_report(name):
+    """Build report filled in by build_ext, makelib and loadModule: wall seconds per phase (parse, pch, compile, link,
+    load, wrappers and total), cache hit or miss, the compiler commands with exit codes and seconds,
+    the parsed warnings and errors and the -ftime-report output (options time_report)"""
+    return {'name': name if isinstance(name, str) else list(name), 'key': None, 'cache': None, 'exit_code': None,
+            'phases': {}, 'commands': [], 'warnings': [], 'errors': [], 'time_report': None}
+
+def add_phase(report, phase, seconds):
+    if report is not None:
+        with _report_lock:
+            report['phases'][phase] = report['phases'].get(phase, 0.0)+seconds
+
+def run_compiler(args, env=None, report=None, phase='compile'):
+    """Run a g++ command, returns its exit code; the output still goes to stderr and the command, its exit code,
+    time and parsed diagnostics are added to report"""
+    t = time.perf_counter()
+    try:
+        proc = subprocess.run(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, errors='replace')
+    except OSError as e: # compiler missing or not executable, reported like a failed compilation
+        proc = subprocess.CompletedProcess(args, 127, '', '%s:0: fatal error: cannot run the compiler: %s\n' % (args[0], e.strerror or e))
+    seconds = time.perf_counter()-t
+    if proc.stdout or proc.stderr:
+        sys.stderr.write(proc.stdout+proc.stderr)
+    if report is not None:
+        with _report_lock: # objects are compiled in threads
+            report['commands'].append({'phase': phase, 'args': list(args), 'exit_code': proc.returncode, 'seconds': seconds})
+            for m in DIAGNOSTIC.finditer(proc.stderr):
+                report['errors' if m.group(4) != 'warning' else 'warnings'].append(
+                    {'file': m.group(1), 'line': int(m.group(2)), 'column': int(m.group(3) or 0), 'message': m.group(5)})
+            if '-ftime-report' in args and phase != 'link':
+                start = proc.stderr.find('Time variable')
+                start = proc.stderr.rfind('\n', 0, start)+1 if start >= 0 else 0
+                report['time_report'] = (report['time_report'] or '')+proc.stderr[start:]
+    return proc.returncode
+
+def key_flags(flags):
+    """flags as part of an object cache key: a file given to -include counts by its content, not its path,
+    the precompiled header is linked into a directory of each build (see precompiled_header)"""
+    out = list(flags)
+    for k in range(1, len(out)):
+        if flags[k-1] == '-include' and os.path.isfile(flags[k]):
+            out[k] = file_digest(flags[k])
+    return out
+
+def compile_objects(sources, sys_type=None, alt_path=None, cflags=None, jobs=None, cache=True, report=None):
+    """Compile sources (.cpp paths) to object files in parallel g++ processes
+
+    Objects of unchanged sources (same text, local includes, flags and compiler) are taken from the
+    build cache, returns list of object paths and exit code (0 on success)
+    """
+    if sys_type is None:
+        sys_type = getSystem()
+    if cflags is None:
+        cflags = build_flags(sys_type)
+    exe, env = compiler_env(sys_type, alt_path)
+    if exe is None:
+        print("Compilation failed. Default mingw directories don't exist and alternative path was not provided.")
+        return [], 1
+    def compile_one(src):
+        obj = os.path.splitext(src)[0]+'.o'
+        key = None
+        if cache:
+            h = hashlib.sha256()
+            for part in ('object', source_digest(src, include_dirs(cflags)), compiler_id(sys_type, alt_path), ' '.join(key_flags(cflags))):
+                h.update(part.encode('utf-8'))
+                h.update(b'\0')
+            key = h.hexdigest()[:32]
+            cached = cached_object(key, obj)
+            if cached is not None:
+                return cached, 0
+        proc = run_compiler([exe]+cflags+['-c', src, '-o', obj], env, report)
+        if proc==0 and key is not None:
+            cache_store(key, src, obj, [])
+        return obj, proc
+    jobs = jobs or os.cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool: # each job waits on its own g++ process
+        results = list(pool.map(compile_one, sources))
+    return [r[0] for r in results], max([r[1] for r in results] or [0])
+
+# headers precompiled together with cppTemplate when options={'pch': True}, a list
+# given as options={'pch': [...]} is added to them (e.g. ['<Eigen/Dense>']); empty by default, so
+# the precompiled header makes no more headers visible to the user code than cppTemplate does without it
+PCH_HEADERS = []
+PCH_NAME = 'npcpp_pch.h'
+
+def pch_headers(options):
+    pch = (options or {}).get('pch')
+    if not pch:
+        return None
+    return PCH_HEADERS + ([] if pch is True else list(pch))
+
+def precompiled_header(sys_type=None, alt_path=None, cflags=None, headers=None, report=None, dest=None):
+    """Path of a precompiled header of cppTemplate and headers for these compile flags, built once and kept in the build cache,
+    with dest the header is linked into the directory dest for a build, so evicting the cache entry does not affect it
+
+    Returns None when the header cannot be precompiled, builds then go on without it
+    """
+    if sys_type is None:
+        sys_type = getSystem()
+    if cflags is None:
+        cflags = build_flags(sys_type)
+    if headers is None:
+        headers = PCH_HEADERS
+    text = ''.join('#include '+h+'\n' for h in headers)
+    text += '#ifndef NPCPP_TEMPLATE\n#define NPCPP_TEMPLATE\n'+cppTemplate+'#endif\n'
+    h = hashlib.sha256()
+    for part in ('pch', text, compiler_id(sys_type, alt_path), ' '.join(cflags)):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    key = h.hexdigest()[:32]
+    entry_dir = os.path.join(CACHE_DIR, key)
+    header = os.path.join(entry_dir, PCH_NAME)
+    if not (os.path.isfile(header+'.gch') and os.path.isfile(os.path.join(entry_dir, 'meta.json'))):
+        exe, env = compiler_env(sys_type, alt_path)
+        if exe is None:
+            return None
+        tmp_dir = entry_dir+'.tmp'+str(os.getpid())
         try:
-            proc = subprocess.Popen(
-                final_command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                env=custom_env,
-                creationflags=subprocess.CREATE_NEW_CONSOLE if shell == "cmd.exe" else 0 # This argument is Windows-specific
-            )
-            print("Errors/Warnings: ", proc.communicate()[1])
-            if re.search(r'\b(?:error|fatal error):', str(proc.communicate()[1]), re.IGNORECASE):
-                proc = 1
-            else:
-                proc = 0
-            try:
-                subprocess.call(["del","'"+pathfilename+".o'"],shell=True)
-            except:
-                pass
-            # see errors here: proc.communicate()[1]
-        except:
+            os.makedirs(tmp_dir)
+            with open(os.path.join(tmp_dir, PCH_NAME), 'w') as f:
+                f.write(text)
+            proc = run_compiler([exe]+cflags+['-x', 'c++-header', os.path.join(tmp_dir, PCH_NAME),
+                                 '-o', os.path.join(tmp_dir, PCH_NAME+'.gch')], env, report, 'pch')
+            if proc!=0:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return None
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump({'name': PCH_NAME, 'codes': [], 'created': time.time()}, f)
+            os.rename(tmp_dir, entry_dir)
+        except (IOError, OSError):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isfile(header+'.gch'): # unless built concurrently by another process
+                return None
+        evict_cache(keep=key, wait=False)
+    with cache_lock(shared=True):
+        if not os.path.isfile(header+'.gch'): # evicted by another process meanwhile
+            return None
+        try:
+            os.utime(os.path.join(entry_dir, 'meta.json'), None)
+        except OSError:
             pass
-    else:   
-        proc=subprocess.call(["g++","-fPIC","-c",pathfilename+".cpp"])
-        proc+=subprocess.call(["g++","-shared","-o",pathfilename+".so",pathfilename+".o"])
+        if dest is None:
+            return header
+        os.makedirs(dest, exist_ok=True)
+        for f in (PCH_NAME, PCH_NAME+'.gch'):
+            link_or_copy(os.path.join(entry_dir, f), os.path.join(dest, f))
+    return os.path.join(dest, PCH_NAME)
+
+def makelib(name,sys_type=None,alt_path=None,profile='release',options=None,sources=None,cache=True,report=None):
+    """Compile and link name.cpp (or the sources, see compile_objects) into the shared library name, returns the exit code
+
+    The commands, their output and the phase times are recorded in report when given, see new_report
+    """
+    pathfilename = os.path.join(os.getcwd(), name)
+    if sys_type is None:
+        sys_type = getSystem()
+    cflags = build_flags(sys_type, profile, options)
+    lflags = link_flags(sys_type, profile, options)
+    exe, env = compiler_env(sys_type, alt_path)
+    if exe is None:
+        print("Compilation failed. Default mingw directories don't exist and alternative path was not provided.")
+        return 1
+    if pch_headers(options) is not None:
+        t = time.perf_counter()
+        pch = precompiled_header(sys_type, alt_path, cflags, pch_headers(options), report, pathfilename+'_pch')
+        add_phase(report, 'pch', time.perf_counter()-t)
+        if pch is not None:
+            cflags = cflags+['-include', pch]
+    t = time.perf_counter()
+    if sources is not None:
+        # multi file build: objects compiled in parallel (or reused), then linked once
+        objects, proc = compile_objects(sources, sys_type, alt_path, cflags, (options or {}).get('jobs'), cache, report)
+    else:
+        objects = [pathfilename+'.o']
+        proc = run_compiler([exe]+cflags+['-c', pathfilename+'.cpp', '-o', objects[0]], env, report)
+    add_phase(report, 'compile', time.perf_counter()-t)
+    if proc==0:
+        t = time.perf_counter()
+        proc = run_compiler([exe, '-o', pathfilename+libext(sys_type)]+objects+lflags, env, report, 'link')
+        add_phase(report, 'link', time.perf_counter()-t)
+    if sources is None and os.path.isfile(objects[0]):
+        os.remove(objects[0])
+    shutil.rmtree(pathfilename+'_pch', ignore_errors=True)
+    if proc==0:
+        record_build(pathfilename+libext(sys_type), profile, cflags, lflags)
     return proc
 
 def loadlib(name,sys_type=None):
@@ -221,12 +1281,18 @@ def loadlib(name,sys_type=None):
         os.add_dll_directory(dll_dir)
         out = ctypes.CDLL(os.path.join(dll_dir, name+".dll"))
     else:
-        out = ctypes.CDLL(os.getcwd()+'/'+name+".so") 
+        out = ctypes.CDLL(os.path.join(os.getcwd(), name+".so"))
     return out
 
 def deloadlib(namespace,sys_type=None,handle_custom=None):
+    """Unload the library of a module (or of a wrapper file name, or the handle handle_custom)
+
+    While numpy arrays over buffers handed over by the library (or ufuncs of it) are alive it is only
+    freed once the last of them is garbage collected, see pin_library
+    """
     if sys_type is None:
         sys_type = getSystem()
+    handle = None
     if handle_custom is not None:
         handle = handle_custom
     else:
@@ -243,26 +1309,486 @@ def deloadlib(namespace,sys_type=None,handle_custom=None):
             #exec('libname = "'+namespace.libname+'"')
             #exec("lib = namespace."+libname)
             #handle = lib._handle
+    if handle is None:
+        return
+    with _pinned_lock:
+        entry = _pinned.get(handle)
+        if entry is not None:
+            entry[2] = True
+    if entry is not None:
+        print("DLL with handle " + str(handle) + " is still used by " + str(entry[1]) +
+              " numpy arrays or ufuncs, it is freed once they are garbage collected")
+        return
+    if free_library(handle, sys_type):
+        print("DLL with handle " + str(handle) + " was freed")
+
+def free_library(handle, sys_type=None):
+    """FreeLibrary/dlclose of handle, False when it failed"""
+    if sys_type is None:
+        sys_type = getSystem()
     if sys_type==0:  
         try:
             _ctypes.FreeLibrary(handle)
-            print("DLL with handle " + str(handle) + " was freed")
-            del namespace
+            return True
         except:
-            pass
+            return False
+    try:
+        #mylib_handle = mylib._handle
+        dlclose_func = ctypes.CDLL(None).dlclose  # This WON'T work on Win
+        dlclose_func.argtypes = [ctypes.c_void_p]
+        return dlclose_func(handle) == 0
+    except:
+        return False
+
+#
+# BUILD CACHE: compiled libraries are stored under CACHE_DIR in a folder named by a hash of
+# the source text, cppTemplate, compiler binary, flags and platform, so an unchanged source
+# is loaded again by copying the cached library instead of running g++
+#
+
+CACHE_DIR = os.environ.get('NPCPP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'npcpp'))
+CACHE_LIMIT = int(os.environ.get('NPCPP_CACHE_LIMIT', 512*1024*1024)) # bytes, least recently used entries are evicted above it
+CACHE_GRACE = 3600 # seconds build directories and sources are kept at least, an unfinished build may still need them
+
+_digests = {}
+
+def libext(sys_type=None):
+    if sys_type is None:
+        sys_type = getSystem()
+    return '.dll' if sys_type==0 else '.so'
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def compiler_id(sys_type=None, alt_path=None):
+    """Identify g++ by its resolved path, size and mtime, so no compiler process is spawned"""
+    if sys_type is None:
+        sys_type = getSystem()
+    if sys_type==0:
+        exe = shutil.which('g++.exe', path=find_mingw(alt_path))
     else:
+        exe = shutil.which('g++')
+    if exe is None:
+        return 'g++'
+    exe = os.path.realpath(exe)
+    st = os.stat(exe)
+    return '{0}:{1}:{2}'.format(exe, st.st_size, int(st.st_mtime))
+
+def cache_key(name, sys_type=None, alt_path=None, flags=None):
+    """Hash of everything that determines the built library of the source file name"""
+    if sys_type is None:
+        sys_type = getSystem()
+    if flags is None:
+        flags = build_flags(sys_type)+link_flags(sys_type)
+    if 'npcpp' not in _digests: # wrapper generation code changes invalidate the cache too
+        _digests['npcpp'] = file_digest(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for part in (os.path.basename(lib_basename(name)), source_digest(name, include_dirs(flags)), cppTemplate, _digests['npcpp'],
+                 compiler_id(sys_type, alt_path), ' '.join(flags), sys.platform, platform.machine()):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()[:32]
+
+def source_list(name):
+    """Source files of a build: name is a .cpp file, a list of them or a directory of .cpp/.cc/.cxx files"""
+    if isinstance(name, (list, tuple)):
+        return list(name)
+    if os.path.isdir(name):
+        return sorted(os.path.join(name, f) for f in os.listdir(name)
+                      if os.path.splitext(f)[1] in ('.cpp', '.cc', '.cxx') and not os.path.splitext(f)[0].endswith('_ext'))
+    return [name]
+
+def lib_basename(name):
+    """Path without extension used for the library, wrapper and handle files of a build"""
+    if isinstance(name, (list, tuple)):
+        return os.path.splitext(name[0])[0]
+    if os.path.isdir(name):
+        return os.path.normpath(name)
+    return os.path.splitext(name)[0]
+
+def include_dirs(flags):
+    """Directories of the -I options in flags, in search order"""
+    out = []
+    for j, f in enumerate(flags):
+        if f == '-I' and j+1 < len(flags):
+            out.append(flags[j+1])
+        elif f.startswith('-I') and len(f) > 2:
+            out.append(f[2:])
+    return out
+
+def local_includes(path, seen=None, dirs=()):
+    """Files included with #include "..." by path, recursively, found as g++ does: relative to the
+    including file, then in the include directories dirs"""
+    if seen is None:
+        seen = set()
+    try:
+        with open(path, 'r') as f:
+            text = f.read()
+    except (IOError, OSError, UnicodeDecodeError):
+        return seen
+    for inc in re.findall(r'^\s*#\s*include\s*"([^"]+)"', text, re.MULTILINE):
+        for d in [os.path.dirname(path)]+list(dirs):
+            inc_path = os.path.normpath(os.path.join(d, inc))
+            if os.path.isfile(inc_path):
+                if inc_path not in seen:
+                    seen.add(inc_path)
+                    local_includes(inc_path, seen, dirs)
+                break
+    return seen
+
+def source_digest(name, dirs=()):
+    """Digest of the sources of a build together with the local headers they include, looked up in the
+    include directories dirs too"""
+    h = hashlib.sha256()
+    for src in source_list(name):
+        for path in [src]+sorted(local_includes(src, dirs=dirs)):
+            h.update(os.path.basename(path).encode('utf-8'))
+            h.update(file_digest(path).encode('utf-8'))
+    return h.hexdigest()
+
+def link_or_copy(src, dst):
+    """Hard link dst to src (or a copy, across file systems), which stays when src is evicted"""
+    if os.path.isfile(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def cached_object(key, dst):
+    """The cached object file of key linked to dst, or None when there is none"""
+    entry_dir = os.path.join(CACHE_DIR, key)
+    obj = os.path.join(entry_dir, 'lib.o')
+    with cache_lock(shared=True):
+        if not os.path.isfile(obj) or not os.path.isfile(os.path.join(entry_dir, 'meta.json')):
+            return None
+        os.utime(os.path.join(entry_dir, 'meta.json'), None)
+        link_or_copy(obj, dst)
+    return dst
+
+def _cache_entries():
+    entries = []
+    if not os.path.isdir(CACHE_DIR):
+        return entries
+    for key in os.listdir(CACHE_DIR):
+        meta_path = os.path.join(CACHE_DIR, key, 'meta.json')
         try:
-            #mylib_handle = mylib._handle
-            dlclose_func = ctypes.CDLL(None).dlclose  # This WON'T work on Win
-            dlclose_func.argtypes = [ctypes.c_void_p]
-            dlclose_func(handle)
-            print("DLL with handle " + str(handle) + " was freed")
-        except:
-            pass
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            entry_dir = os.path.join(CACHE_DIR, key)
+            size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            entries.append({'key': key, 'name': meta['name'], 'functions': [c[0] for c in meta['codes']],
+                            'kind': 'object' if os.path.isfile(os.path.join(entry_dir, 'lib.o')) else
+                                    'pch' if os.path.isfile(os.path.join(entry_dir, PCH_NAME+'.gch')) else 'library',
+                            'size': size, 'created': meta['created'], 'last_used': os.path.getmtime(meta_path)})
+        except (IOError, OSError, ValueError, KeyError):
+            pass # partially written or foreign entry
+    return entries
+
+def cache_lookup(key, sys_type=None):
+    """Library path (without extension) and parsed exports of the cache entry key, or None"""
+    entry_dir = os.path.join(CACHE_DIR, key)
+    try:
+        with open(os.path.join(entry_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if not os.path.isfile(os.path.join(entry_dir, 'lib'+libext(sys_type))):
+            return None
+        os.utime(os.path.join(entry_dir, 'meta.json'), None)
+    except (IOError, OSError, ValueError):
+        return None
+    return os.path.join(entry_dir, 'lib'), meta['codes']
+
+def cache_store(key, name, libfile, codes):
+    entry_dir = os.path.join(CACHE_DIR, key)
+    tmp_dir = entry_dir+'.tmp'+str(os.getpid())
+    try:
+        os.makedirs(tmp_dir)
+        shutil.copyfile(libfile, os.path.join(tmp_dir, 'lib'+os.path.splitext(libfile)[1]))
+        if os.path.isfile(libfile+'.json'):
+            shutil.copyfile(libfile+'.json', os.path.join(tmp_dir, 'build.json'))
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({'name': name, 'codes': codes, 'created': time.time()}, f)
+        os.rename(tmp_dir, entry_dir)
+    except (IOError, OSError):
+        shutil.rmtree(tmp_dir, ignore_errors=True) # entry stored concurrently by another process or disk problem
+        return
+    evict_cache(keep=key, wait=False)
+
+def _work_files():
+    """Build directories (with their lock files), lock files left by finished builds and cppFunction sources
+    in the cache, as items for evict_cache"""
+    items = []
+    for sub in ('builds', 'sources'):
+        d = os.path.join(CACHE_DIR, sub)
+        if not os.path.isdir(d):
+            continue
+        names = os.listdir(d)
+        for f in names:
+            path = os.path.join(d, f)
+            if f.endswith('.lock') and f[:-len('.lock')] in names:
+                continue # removed together with its build directory
+            try:
+                size = os.path.getsize(path)
+                for root, dirs, files in os.walk(path):
+                    size += sum(os.path.getsize(os.path.join(root, g)) for g in files)
+                items.append({'path': path, 'size': size, 'last_used': os.path.getmtime(path),
+                              'lock': (path if f.endswith('.lock') else path+'.lock') if sub == 'builds' else None})
+            except OSError:
+                pass # removed meanwhile
+    return items
+
+def _remove_work(item):
+    """Remove a build directory or lock file unless its build is running, returns whether it was removed"""
+    if item['lock'] is None:
+        shutil.rmtree(item['path'], ignore_errors=True)
+        return True
+    try:
+        with file_lock(item['lock'], wait=False):
+            if item['path'] != item['lock']:
+                shutil.rmtree(item['path'], ignore_errors=True)
+            try:
+                os.remove(item['lock'])
+            except OSError: # open elsewhere on Windows
+                pass
+    except BlockingIOError:
+        return False
+    return True
+
+def evict_cache(limit=None, keep=None, wait=True):
+    """Remove least recently used entries until the cache fits in limit bytes
+
+    Build directories, their lock files and cppFunction sources count against the limit too, they are removed
+    once CACHE_GRACE seconds old and not used by a running build. Eviction holds the exclusive cache lock,
+    with wait=False it is skipped while the lock is taken (an entry is being loaded)
+    """
+    if limit is None:
+        limit = CACHE_LIMIT
+    try:
+        with cache_lock(wait=wait):
+            now = time.time()
+            items = sorted(_cache_entries()+_work_files(), key=lambda e: e['last_used'])
+            total = sum(e['size'] for e in items)
+            removed = 0
+            for e in items:
+                if total <= limit:
+                    break
+                if 'key' in e:
+                    if e['key'] == keep:
+                        continue
+                    shutil.rmtree(os.path.join(CACHE_DIR, e['key']), ignore_errors=True)
+                elif now-e['last_used'] < CACHE_GRACE or not _remove_work(e):
+                    continue
+                total -= e['size']
+                removed += 1
+            return removed
+    except BlockingIOError:
+        return 0
+
+def cache_info():
+    """Summary of the build cache: location, limit, total size (work: of build directories and sources) and
+    entries from most recently used"""
+    entries = sorted(_cache_entries(), key=lambda e: e['last_used'], reverse=True)
+    work = sum(e['size'] for e in _work_files())
+    return {'dir': CACHE_DIR, 'limit': CACHE_LIMIT, 'size': sum(e['size'] for e in entries)+work, 'work': work, 'entries': entries}
+
+def purge_cache(key=None):
+    """Remove one cache entry by key (or all of them, the build directories and profile data when key is None),
+    returns number removed"""
+    if key is None:
+        for d in ('builds', 'sources', 'profiles'):
+            shutil.rmtree(os.path.join(CACHE_DIR, d), ignore_errors=True)
+    keys = [e['key'] for e in _cache_entries()] if key is None else [key]
+    removed = 0
+    for k in keys:
+        entry_dir = os.path.join(CACHE_DIR, k)
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            removed += 1
+    return removed
+
+def set_cache_limit(nbytes):
+    global CACHE_LIMIT
+    CACHE_LIMIT = int(nbytes)
+    return evict_cache()
+
+def build_dir(key):
+    """Working directory of the build with cache key, builds of different sources or flags never share files"""
+    return os.path.join(CACHE_DIR, 'builds', key)
+
+class file_lock(object):
+    """Exclusive (or shared) lock of the file path (created when missing) for a with block, between threads
+    and processes, with wait=False entering raises BlockingIOError instead of waiting for it
+
+    Windows has no shared locks here, shared locks are exclusive there
+    """
+    def __init__(self, path, shared=False, wait=True):
+        self.path = path
+        self.shared = shared
+        self.wait = wait
+        self.file = None
+    def __enter__(self):
+        while True:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, 'a+')
+            self.file.seek(0)
+            try:
+                self._lock()
+            except BaseException:
+                self.file.close()
+                raise
+            # evict_cache removes lock files while holding them, a file removed meanwhile is locked again
+            try:
+                if os.path.samestat(os.fstat(self.file.fileno()), os.stat(self.path)):
+                    return self
+            except OSError:
+                pass
+            self.__exit__()
+    def _lock(self):
+        if getSystem()==0:
+            import msvcrt
+            if not self.wait:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+                except OSError:
+                    raise BlockingIOError("%s is locked" % self.path)
+                return
+            while True:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError: # LK_LOCK gives up after 10 seconds
+                    pass
+        else:
+            import fcntl
+            fcntl.flock(self.file.fileno(), (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | (0 if self.wait else fcntl.LOCK_NB))
+    def __exit__(self, *exc):
+        if getSystem()==0:
+            import msvcrt
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+        return False
+
+def cache_lock(shared=False, wait=True):
+    """Lock of the whole build cache: shared while an entry is looked up and used, exclusive to evict entries"""
+    return file_lock(os.path.join(CACHE_DIR, 'cache.lock'), shared, wait)
+
+_builds = {}
+
+def build_ext(name,sys_type=None,recompile=True,alt_path=None,cache=True,profile='release',options=None,report=None):
+    """Parse name and build its library (or take it from the build cache), returns parsed exports, exit code
+    and path of the library without extension
+
+    name is a .cpp file, or a list of them or a directory for a library built from several translation units.
+    Every build runs in its own directory named by the cache key (see build_dir) while holding a file lock on it,
+    so concurrent builds in threads or processes do not share files and identical builds are done once.
+    report (see new_report) gets the cache key, hit or miss, parse time and the compiler runs
+    """
+    if sys_type is None:
+        sys_type = getSystem()
+    if report is None:
+        report = new_report(name)
+    flags = build_flags(sys_type, profile, options)+link_flags(sys_type, profile, options)
+    if pch_headers(options) is not None:
+        flags.append('pch:'+','.join(pch_headers(options)))
+    pgo_profile = (options or {}).get('pgo_profile') if (options or {}).get('pgo') == 'use' else None
+    if pgo_profile is not None: # builds with other profile data are other libraries
+        flags.append('pgo:'+profile_digest(pgo_profile))
+    entries = requested_entries(options)
+    if entries:
+        flags.append('entries:'+','.join(entries))
+    key = cache_key(name, sys_type, alt_path, flags)
+    work = build_dir(key)
+    if (options or {}).get('pgo'):
+        # g++ -fprofile-use checks the file names of functions against the profile data, so the instrumented
+        # and the optimized build of a source compile the same paths
+        work = build_dir('pgo_'+hashlib.sha256(os.path.abspath(lib_basename(name)).encode('utf-8')).hexdigest()[:32])
+    libfile = os.path.join(work, os.path.basename(lib_basename(name))+"_ext")
+    build_key = os.path.abspath(lib_basename(name))
+    report['key'] = key
+    report['cache'] = 'hit'
+    report['exit_code'] = 0
+    if (cache or not recompile) and cache_lookup(key, sys_type) is not None:
+        libfile, newcodes = cache_lookup(key, sys_type)
+        _builds[build_key] = os.path.join(CACHE_DIR, key, 'build.json')
+        return newcodes, 0, libfile
+    with file_lock(work+'.lock'):
+        if cache and cache_lookup(key, sys_type) is not None: # built meanwhile by another thread or process
+            libfile, newcodes = cache_lookup(key, sys_type)
+            _builds[build_key] = os.path.join(CACHE_DIR, key, 'build.json')
+            return newcodes, 0, libfile
+        report['cache'] = 'miss' if cache else 'disabled'
+        t = time.perf_counter()
+        os.makedirs(work, exist_ok=True)
+        sources = source_list(name)
+        if isinstance(name, str) and len(sources)==1:
+            newcodes = make_ext(name,sys_type,ext=libfile+".cpp",entries=entries)
+            ext_sources = None
+        else:
+            newcodes = []
+            ext_sources = []
+            for k, src in enumerate(sources):
+                ext_sources.append(os.path.join(work, '%d_%s_ext.cpp' % (k, os.path.splitext(os.path.basename(src))[0])))
+                codes = make_ext(src,sys_type,thread_control=(k==len(sources)-1),ext=ext_sources[-1],entries=entries)
+                duplicates = set(c[0] for c in codes) & set(c[0] for c in newcodes)
+                if duplicates:
+                    raise ValueError("Functions exported from more than one source: %s" % ', '.join(sorted(duplicates)))
+                newcodes += codes
+        add_phase(report, 'parse', time.perf_counter()-t)
+        if pgo_profile is not None:
+            # g++ -fprofile-use reads name_ext.gcda next to the object it compiles
+            for f in os.listdir(pgo_profile):
+                if f.endswith('.gcda'):
+                    shutil.copyfile(os.path.join(pgo_profile, f), os.path.join(work, f))
+        if not recompile:
+            if not os.path.isfile(libfile+libext(sys_type)):
+                print("No library was built for %s with these settings, call it with recompile=True." % name)
+                report['exit_code'] = 1
+                return newcodes, 1, libfile
+            proc = 0
+        else:
+            # objects of profile builds are not shared, their profile data is tied to the build directory
+            proc = makelib(libfile,sys_type,alt_path=alt_path,profile=profile,options=options,sources=ext_sources,
+                           cache=cache and not (options or {}).get('pgo'),report=report)
+        report['exit_code'] = proc
+        _builds[build_key] = libfile+libext(sys_type)+'.json'
+        if proc==0 and recompile and cache:
+            cache_store(key, name, libfile+libext(sys_type), newcodes)
+            if cache_lookup(key, sys_type) is not None: # loaded from the cache entry, the working files are not needed
+                shutil.rmtree(work, ignore_errors=True)
+                try: # builds waiting for the lock notice that it was removed, see file_lock
+                    os.remove(work+'.lock')
+                except OSError:
+                    pass
+                libfile = os.path.join(CACHE_DIR, key, 'lib')
+                _builds[build_key] = os.path.join(CACHE_DIR, key, 'build.json')
+    return newcodes, proc, libfile
+
+def build_and_use(name, use, sys_type=None, **build_args):
+    """build_ext of name, then use(newcodes, libfile) while holding the shared cache lock, so a library found
+    in the cache is not evicted before it is loaded or copied (it is built again when that happened already,
+    without holding the lock: build_ext takes it itself, and it is exclusive on Windows)
+
+    Returns the parsed exports, the exit code and the result of use, None when the build failed
+    """
+    if sys_type is None:
+        sys_type = getSystem()
+    while True:
+        newcodes, proc, libfile = build_ext(name, sys_type, **build_args)
+        if proc!=0:
+            return newcodes, proc, None
+        with cache_lock(shared=True):
+            if os.path.isfile(libfile+libext(sys_type)): # else evicted by another process meanwhile
+                return newcodes, proc, use(newcodes, libfile)
 
-def grabFuncName(line):
-    return line.split('(')[0].split()[-1]
-    
 def translate(input_list):
     if not isinstance(input_list, (list,)):
         input_list = [input_list]
@@ -289,28 +1815,23 @@ def translate(input_list):
         'void*': 'c_void_p',
         'wchar_t': 'c_wchar',
         'wchar_t*': 'c_wchar_p',
-        'std::vector<double>': 'vectd',
-        'vector<double>': 'vectd',
-        'vect<double>': 'vectd',
-        'std::vector<float>': 'vectd',
-        'vector<float>': 'vectd',
-        'vect<float>': 'vectd',        
-        'std::vector<int>': 'vecti',
-        'vector<int>': 'vecti',
-        'vect<int>': 'vecti',
-        'std::vector<long>': 'vecti',
-        'vector<long>': 'vecti',
-        'vect<long>': 'vecti',
-        'std::vector<longlong>': 'vectll',
-        'vector<longlong>': 'vectll',
-        'vect<longlong>': 'vectll', 
-        'std::vector<short>': 'vecti',
-        'vector<short>': 'vecti',
-        'vect<short>': 'vecti',
-        'std::vector<bool>': 'vectb',
-        'vector<bool>': 'vectb',
-        'vect<bool>': 'vectb'}
+        'int8_t': 'c_int8',
+        'int16_t': 'c_int16',
+        'int32_t': 'c_int32',
+        'int64_t': 'c_int64',
+        'uint8_t': 'c_uint8',
+        'uint16_t': 'c_uint16',
+        'uint32_t': 'c_uint32',
+        'uint64_t': 'c_uint64',
+        'unsigned': 'c_uint',
+        'unsignedlong': 'c_ulong'}
+    for element, vect_class in VECT_ELEMENTS.items():
+        for prefix in ('std::vector<', 'vector<', 'vect<'):
+            translation_map[prefix+element+'>'] = vect_class
+        translation_map['ndarr<'+element+'>'] = 'ndarr'+vect_class[4:]
     output_list = []
+    #views are passed through the same structures as vectors
+    input_list = [re.sub(r'^(?:std::)?(?:span|npview)<', 'vect<', word).replace('std::int', 'int').replace('std::uint', 'uint') for word in input_list]
     #iterate the input words and append translation
     #(or word if no translation) to the output
     for word in input_list:
@@ -320,179 +1841,555 @@ def translate(input_list):
     #convert output list back to string
     return output_list
 
-def replace_all_types(mystr):
-    mystr = mystr.replace('std::vector<double>', 'vect<double>')        
-    mystr = mystr.replace('std::vector<float>', 'vect<float>')
-    mystr = mystr.replace('std::vector<short>', 'vect<short>')                
-    mystr = mystr.replace('std::vector<int>', 'vect<int>')
-    mystr = mystr.replace('std::vector<long>', 'vect<long>')
-    mystr = mystr.replace('std::vector<longlong>', 'vect<long long>')
-    mystr = mystr.replace('std::vector<bool>', 'vect<bool>')
-    return mystr
-
-def do_argument_line(data_i,file):
-    fargs = []
-    someline = data_i.split(",")
-    if len(someline) == 1: #only one case
-        fargs.append(someline[0].split(')')[0])
+#
+# SIGNATURE PARSER: exported functions are found with a small C++ tokenizer, so declarations may span
+# any number of lines, contain comments, namespaces, template types, const/references and default arguments
+#
+
+_token_re = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<pre>^[ \t]*\#(?:\\\n|[^\n])*)
+  | (?P<str>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+  | (?P<id>[A-Za-z_]\w*)
+  | (?P<num>\.?\d(?:[eE][+-]|[\w.])*)
+  | (?P<punct>::|->|\.\.\.|[^\s\w])
+''', re.VERBOSE | re.MULTILINE | re.DOTALL)
+
+def tokenize(text):
+    """List of (kind, value, line) tokens of C++ text: id, num, str, punct and export for npcpp::export
+    comments (value is the list of export options), other comments and preprocessor lines are dropped"""
+    tokens = []
+    line = 1
+    for m in _token_re.finditer(text):
+        kind = m.lastgroup
+        value = m.group()
+        if kind == 'comment' and 'npcpp::export' in value:
+            options = value.split('npcpp::export', 1)[1].replace('*/', '').split()
+            tokens.append(('export', options, line))
+        elif kind not in ('ws', 'comment', 'pre'):
+            tokens.append((kind, value, line))
+        line += value.count('\n')
+    return tokens
+
+def split_top(tokens, sep):
+    """Split tokens at sep outside of (), <>, [] and {}"""
+    parts = [[]]
+    depth = 0
+    for t in tokens:
+        if t[1] in ('(', '<', '[', '{'):
+            depth += 1
+        elif t[1] in (')', '>', ']', '}'):
+            depth -= 1
+        if t[1] == sep and depth == 0 and t[0] == 'punct':
+            parts.append([])
+        else:
+            parts[-1].append(t)
+    return parts
+
+def spell(tokens):
+    """C++ text of tokens, with spaces only between words"""
+    out = ''
+    prev = None
+    for t in tokens:
+        if prev is not None and prev[0] in ('id', 'num') and t[0] in ('id', 'num'):
+            out += ' '
+        out += t[1] if t[1] != ',' else ', '
+        prev = t
+    return out
+
+# multi word C++ types and the single word names used by translate and VECT_ELEMENTS
+TYPE_ALIASES = [('unsigned long long int', 'uint64_t'), ('unsigned long long', 'uint64_t'), ('long long int', 'longlong'),
+                ('long long', 'longlong'), ('unsigned long int', 'unsignedlong'), ('unsigned long', 'unsignedlong'),
+                ('unsigned int', 'unsigned'), ('unsigned short', 'uint16_t'), ('unsigned char', 'uint8_t'),
+                ('signed char', 'int8_t'), ('short int', 'short'), ('long int', 'long'), ('std::size_t', 'size_t')]
+
+BUILTIN_TYPES = ('int', 'long', 'short', 'char', 'double', 'float', 'bool', 'unsigned', 'signed', 'void', 'auto', 'wchar_t')
+
+def parse_type(tokens, where):
+    """Describe a parameter or return type: C++ spelling without const/references, translate key, kind and element type"""
+    ref = any(t[1] == '&' for t in tokens)
+    const = any(t[1] == 'const' for t in tokens)
+    # leading const and references belong to the parameter, const inside <> (std::span<const double>) to the element
+    depth = 0
+    kept = []
+    for t in tokens:
+        if t[1] == '<':
+            depth += 1
+        elif t[1] == '>':
+            depth -= 1
+        if depth == 0 and t[1] in ('const', 'volatile', '&', '&&', 'typename', 'struct'):
+            continue
+        kept.append(t)
+    if not kept:
+        raise ValueError("Missing type in %s." % where)
+    cpp = spell(kept)
+    key = ' '.join(cpp.split())
+    for words, alias in TYPE_ALIASES:
+        key = re.sub(r'\b'+re.escape(words)+r'\b', alias, key)
+    key = key.replace(' ', '').replace('std::int', 'int').replace('std::uint', 'uint')
+    info = {'cpp': cpp, 'key': key, 'kind': 'scalar', 'elem': None, 'mutable_ref': ref and not const}
+    m = re.match(r'^(?:std::|npcpp::)?(vector|span|npview|vect|ndarr)<(.*)>$', cpp)
+    if m:
+        info['kind'] = {'vector': 'vector', 'span': 'view', 'npview': 'view', 'vect': 'vect', 'ndarr': 'ndarr'}[m.group(1)]
+        info['elem'] = re.sub(r'^const\s+', '', m.group(2).strip())
+        elem_key = info['elem']
+        for words, alias in TYPE_ALIASES:
+            elem_key = re.sub(r'\b'+re.escape(words)+r'\b', alias, elem_key)
+        elem_key = elem_key.replace(' ', '').replace('std::int', 'int').replace('std::uint', 'uint')
+        info['key'] = ('ndarr<' if info['kind'] == 'ndarr' else 'vect<')+elem_key+'>'
+    return info
+
+def py_default(text):
+    """Python spelling of a C++ default argument, None when it has no simple equivalent"""
+    text = text.strip()
+    if text in ('true', 'false'):
+        return text.capitalize()
+    if text in ('nullptr', 'NULL'):
+        return 'None'
+    m = re.match(r'^([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)[fFlLuU]*$', text)
+    if m:
+        return m.group(1)
+    if re.match(r'^"(?:\\.|[^"\\])*"$', text):
+        return text
+    return None
+
+def parse_exports(text, name='<source>'):
+    """Signatures of functions preceded by an npcpp::export comment in C++ text
+
+    Each signature is a dict with name, qualname (with enclosing namespaces), ret and params
+    (name, type as from parse_type, default) and the export options
+    """
+    tokens = tokenize(text)
+    signatures = []
+    namespaces = [] # (name, brace depth inside it)
+    depth = 0
+    i = 0
+    while i < len(tokens):
+        kind, value, line = tokens[i]
+        if kind == 'id' and value == 'namespace' and (i == 0 or tokens[i-1][1] != 'using'):
+            j = i+1
+            while j < len(tokens) and tokens[j][1] not in ('{', ';', '='):
+                j += 1
+            if j < len(tokens) and tokens[j][1] == '{':
+                depth += 1
+                namespaces.append((''.join(t[1] for t in tokens[i+1:j] if t[1] != 'inline'), depth))
+                i = j+1
+                continue
+        elif value == '{' and kind == 'punct':
+            depth += 1
+        elif value == '}' and kind == 'punct':
+            depth -= 1
+            while namespaces and namespaces[-1][1] > depth:
+                namespaces.pop()
+        elif kind == 'export':
+            sig, i = parse_declaration(tokens, i+1, name, line)
+            sig['options'] = value
+            sig['qualname'] = '::'.join([n for n, _ in namespaces if n]+[sig['qualname']])
+            signatures.append(sig)
+            continue
+        i += 1
+    return signatures
+
+def parse_declaration(tokens, i, name, line):
+    """Parse the function declaration starting at tokens[i], returns signature and index of the token after it"""
+    where = "export at %s:%d" % (name, line)
+    head = []
+    depth = 0
+    while i < len(tokens) and not (tokens[i][1] == '(' and depth == 0):
+        t = tokens[i]
+        if t[1] == '<':
+            depth += 1
+        elif t[1] == '>':
+            depth -= 1
+        elif t[1] in (';', '{', '}'):
+            raise ValueError("No function declaration follows %s." % where)
+        head.append(t)
+        i += 1
+    if i >= len(tokens):
+        raise ValueError("No function declaration follows %s." % where)
+    if head and head[0][1] == 'template':
+        raise ValueError("Templates cannot be exported (%s), export a function calling an instantiation instead." % where)
+    # attributes and specifiers do not belong to the return type
+    cleaned = []
+    k = 0
+    while k < len(head):
+        if head[k][1] == '[' and k+1 < len(head) and head[k+1][1] == '[':
+            while k < len(head) and not (head[k][1] == ']' and head[k-1][1] == ']'):
+                k += 1
+        elif head[k][1] not in ('inline', 'static', 'extern', 'constexpr', 'friend', 'virtual', 'DLLEXPORT') and head[k][0] != 'str':
+            cleaned.append(head[k])
+        k += 1
+    if not cleaned or cleaned[-1][0] != 'id':
+        raise ValueError("Cannot find the function name of %s." % where)
+    # qualified definitions like ns::f keep their qualification for the call
+    q = len(cleaned)-1
+    while q >= 2 and cleaned[q-1][1] == '::' and cleaned[q-2][0] == 'id':
+        q -= 2
+    fname = cleaned[-1][1]
+    qualname = ''.join(t[1] for t in cleaned[q:])
+    ret_tokens = cleaned[:q]
+    # parameter list up to the matching parenthesis
+    depth = 0
+    start = i+1
+    while i < len(tokens):
+        if tokens[i][1] == '(':
+            depth += 1
+        elif tokens[i][1] == ')':
+            depth -= 1
+            if depth == 0:
+                break
+        i += 1
+    params_tokens = tokens[start:i]
+    i += 1
+    if [t for t in ret_tokens if t[1] == 'auto'] and i < len(tokens) and tokens[i][1] == '->': # trailing return type
+        ret_tokens = []
+        i += 1
+        while i < len(tokens) and tokens[i][1] not in ('{', ';'):
+            ret_tokens.append(tokens[i])
+            i += 1
+    if not ret_tokens:
+        raise ValueError("Missing return type in %s." % where)
+    params = []
+    if params_tokens and not (len(params_tokens) == 1 and params_tokens[0][1] == 'void'):
+        for k, p in enumerate(split_top(params_tokens, ',')):
+            parts = split_top(p, '=')
+            decl = parts[0]
+            default = spell(p[len(decl)+1:]) if len(parts) > 1 else None
+            if [t for t in decl if t[1] == '...']:
+                raise ValueError("Variadic parameters are not supported in %s." % where)
+            array = False # double x[] (or x[10]) is a pointer
+            while decl and decl[-1][1] == ']' and [t for t in decl if t[1] == '[']:
+                decl = decl[:max(j for j, t in enumerate(decl) if t[1] == '[')]
+                array = True
+            # the name is the last word, unless the declaration is only a type (unnamed parameter)
+            if len(decl) > 1 and decl[-1][0] == 'id' and decl[-1][1] not in BUILTIN_TYPES and \
+                    decl[-2][1] not in ('::', 'const', 'volatile', 'struct', 'typename'):
+                pname = decl[-1][1]
+                ptype = decl[:-1]
+            else:
+                pname = 'arg%d' % k
+                ptype = decl
+            if array:
+                ptype = ptype+[('punct', '*', line)]
+            params.append({'name': pname, 'type': parse_type(ptype, where), 'default': default})
+    return {'name': fname, 'qualname': qualname, 'ret': parse_type(ret_tokens, where), 'params': params}, i
+
+_parsed = {}
+
+def parse_exports_cached(text, name='<source>'):
+    """parse_exports keyed by the hash of text, so unchanged sources are not parsed again"""
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    if key not in _parsed:
+        if len(_parsed) >= 256:
+            del _parsed[next(iter(_parsed))]
+        _parsed[key] = parse_exports(text, name)
+    return _parsed[key]
+
+# scalar types of exports which get a batched entry point, numpy has a dtype for each of them
+BATCH_CTYPES = ('c_bool', 'c_double', 'c_float', 'c_int', 'c_short', 'c_long', 'c_longlong', 'c_size_t', 'c_uint', 'c_ulong',
+                'c_int8', 'c_int16', 'c_int32', 'c_int64', 'c_uint8', 'c_uint16', 'c_uint32', 'c_uint64')
+
+def core_dims(sig):
+    """Core dimension of every argument (None when scalar) and of the result from the gufunc=<signature>
+    export option, e.g. gufunc=(n),()->(n); None when the export has no such option"""
+    option = [o for o in sig['options'] if o.startswith('gufunc=')]
+    if not option:
+        return None
+    text = option[0][len('gufunc='):]
+    where = "gufunc signature '%s' of '%s'" % (text, sig['name'])
+    if text.count('->') != 1:
+        raise ValueError("Missing '->' in %s." % where)
+    inputs, outputs = [re.findall(r'\(([^()]*)\)', side) for side in text.split('->')]
+    if len(inputs) != len(sig['params']) or len(outputs) != 1:
+        raise ValueError("The %s needs %d inputs and one output." % (where, len(sig['params'])))
+    dims = []
+    for core, info in zip(inputs+outputs, [p['type'] for p in sig['params']]+[sig['ret']]):
+        names = [d.strip() for d in core.split(',') if d.strip()]
+        vector = info['kind'] in ('vector', 'view', 'vect')
+        if len(names) != (1 if vector else 0) or (names and not re.match(r'^[A-Za-z_]\w*$', names[0])):
+            raise ValueError("Every vector needs one named core dimension and every scalar () in %s." % where)
+        if info['kind'] == 'ndarr' or info['key'] == 'void' or (info['kind'] in ('view', 'vect') and info['elem'] == 'bool'):
+            raise ValueError("Types of '%s' are not supported by gufunc loops." % sig['name'])
+        dims.append(names[0] if names else None)
+    if sig['ret']['kind'] == 'vect':
+        raise ValueError("gufunc export '%s' has to return std::vector or a scalar." % sig['name'])
+    return dims
+
+def ufunc_loop(sig):
+    """C++ code of the numpy ufunc inner loop _npcpp_ufunc_name of an elementwise scalar export, or of a gufunc
+    loop when the export declares gufunc=<signature>, empty when the export has neither"""
+    dims = core_dims(sig)
+    params, ret = sig['params'], sig['ret']
+    nargs = len(params)+1
+    if dims is None:
+        ctypes_names = [translate(p['type']['key'])[0] for p in params]
+        if not params or translate(ret['key'])[0] not in BATCH_CTYPES or \
+                not all(t in BATCH_CTYPES and not p['type']['mutable_ref'] for t, p in zip(ctypes_names, params)):
+            return ''
+        dims = [None]*nargs
+    # numpy passes the outer size and then the core sizes in order of first appearance of their names,
+    # steps are the outer step of each argument followed by the core steps
+    names = []
+    for d in dims:
+        if d is not None and d not in names:
+            names.append(d)
+    size, step = {}, {}
+    for j, d in enumerate(dims):
+        if d is not None:
+            size[j] = 'dimensions[%d]' % (1+names.index(d))
+            step[j] = 'steps[%d]' % (nargs+len(step))
+    code = 'DLLEXPORT void _npcpp_ufunc_'+sig['name']+'(char** args, const intptr_t* dimensions, const intptr_t* steps, void*)\n{\n\tNPCPP_ENTER\n'
+    call_args = []
+    for j, p in enumerate(params):
+        info = p['type']
+        if dims[j] is None:
+            call_args.append('*(const %s*)(args[%d] + i*steps[%d])' % (info['cpp'], j, j))
+            continue
+        code += '\t%s npcpp_v%d(%s);\n' % (info['cpp'] if info['kind'] == 'vector' else 'std::vector<'+info['elem']+'>', j, size[j])
+        if info['kind'] == 'vector':
+            call_args.append('npcpp_v%d' % j)
+        else:
+            call_args.append('%s(npcpp_v%d.data(), npcpp_v%d.size())' % (info['cpp'], j, j))
+    code += '\tfor (intptr_t i = 0; i < dimensions[0]; ++i)\n\t{\n'
+    for j, p in enumerate(params):
+        if dims[j] is not None:
+            code += '\t\tfor (intptr_t k = 0; k < %s; ++k)\n' % size[j]
+            code += '\t\t\tnpcpp_v%d[k] = *(const %s*)(args[%d] + i*steps[%d] + k*%s);\n' % (j, p['type']['elem'], j, j, step[j])
+    call = sig['qualname']+'('+', '.join(call_args)+')'
+    out = nargs-1
+    if dims[out] is None:
+        code += '\t\t*(%s*)(args[%d] + i*steps[%d]) = %s;\n' % (ret['cpp'], out, out, call)
     else:
-        if len(someline[1]) > 0 and someline[1]!='\n': #longer line case
-            pass #next argument after colon, think about it
+        # results longer than the output core dimension are cut, shorter ones leave the rest of the output as it was
+        code += '\t\tauto npcpp_r = %s;\n' % call
+        code += '\t\tfor (intptr_t k = 0; k < std::min((intptr_t)npcpp_r.size(), %s); ++k)\n' % size[out]
+        code += '\t\t\t*(%s*)(args[%d] + i*steps[%d] + k*%s) = npcpp_r[k];\n' % (ret['elem'], out, out, step[out])
+    code += '\t}\n}\n\n'
+    return code
+
+# optional entry points of exports, generated only when the export option or the load option of that name is set:
+# fast (pointer and size pairs), out (out= buffers), batch (scalar loops over arrays) and ufunc (numpy inner loops)
+ENTRIES = ('fast', 'out', 'batch', 'ufunc')
+
+def requested_entries(options):
+    """Optional entry points requested for all exports by the load options"""
+    return [e for e in ENTRIES if (options or {}).get(e)]
+
+def ext_function(sig, entries=()):
+    """C++ code of the extern "C" entry point _name of an export, and its newcodes entry for the wrappers
+
+    The optional entry points are added when named in entries or in the export options, see ENTRIES
+    """
+    wanted = set(entries) | set(sig['options'])
+    vectors, vects, views = [], [], []
+    ext_params, call_args, before, after = [], [], '', ''
+    out_args, converted = [], '' # arguments of the out= entry, copies made before its result is allocated
+    def ext_type(info):
+        if info['kind'] in ('vector', 'view', 'vect'):
+            return 'vect<'+info['elem']+'>'
+        if info['kind'] == 'ndarr':
+            return 'ndarr<'+info['elem']+'>'
+        return info['cpp']
+    for j, p in enumerate(sig['params'], 1):
+        info, pname = p['type'], p['name']
+        ext_params.append(ext_type(info)+' '+pname)
+        if info['kind'] == 'vector':
+            vectors.append(j)
+            # npcpp::vector<T> arguments are copied into the arena
+            convert = 'arr2pool' if info['cpp'].startswith('npcpp::') else 'arr2vec'
+            if info['mutable_ref']: # changes made through std::vector<T>& are copied back into the numpy buffer
+                views.append(j) # so it has to be the caller's array itself, checked like a view argument
+                before += '\t'+info['cpp']+' '+pname+'_v = '+convert+'('+pname+');\n'
+                after += '\tstd::copy('+pname+'_v.begin(), '+pname+'_v.begin()+std::min('+pname+'_v.size(), '+pname+'.size), '+pname+'.arr);\n'
+                call_args.append(pname+'_v')
+                out_args.append(pname+'_v')
+            else:
+                call_args.append(convert+'('+pname+')')
+                converted += '\tauto npcpp_a%d = %s(%s);\n' % (j, convert, pname)
+                out_args.append('std::move(npcpp_a%d)' % j)
+        elif info['kind'] == 'view':
+            views.append(j)
+            call_args.append(info['cpp']+'('+pname+'.arr, '+pname+'.size)')
+            out_args.append(call_args[-1])
         else:
-            fargs.append(someline[0].split(')')[0])
-    #fargs.append(data_i.split(","))
-    #if data_i.find('std::vector<') != -1:
-        #vectors.append(len(fargs))
-    data_i = data_i.replace('{', '').replace(')', '')
-    data_i = replace_all_types(data_i)   
-    file.write(data_i)
-    return fargs
-
-def make_ext(name,sys_type=0):#the main parsing function
-    newcodes = []
-    filename = name.split('.')[0]
-    with open(name, "r")  as f:
-        data = f.readlines()
-    for i in range(len(data)):
-        data[i] = data[i].replace('long long', 'longlong')
-    file = open(filename+"_ext.cpp", "w")
-    file.write(cppTemplate)
+            if info['kind'] in ('vect', 'ndarr'):
+                vects.append(j)
+            call_args.append(pname)
+            out_args.append(pname)
+    ret = sig['ret']
+    if ret['kind'] == 'view':
+        raise ValueError("Export '%s' cannot return a view, return std::vector or ndarr instead." % sig['name'])
+    call = sig['qualname']+'('+', '.join(call_args)+')'
+    if ret['kind'] == 'vector':
+        vectors.insert(0, 0)
+        call = 'vec2arr('+call+')'
+    elif ret['kind'] in ('vect', 'ndarr'):
+        vects.insert(0, 0)
+    code = 'DLLEXPORT '+ext_type(ret)+' _'+sig['name']+'('+', '.join(ext_params)+')\n{\n\tNPCPP_ENTER\n'+before
+    if not after:
+        code += '\treturn '+call+';\n'
+    elif ret['key'] == 'void':
+        code += '\t'+call+';\n'+after
+    else:
+        code += '\tauto npcpp_result = '+call+';\n'+after+'\treturn npcpp_result;\n'
+    code += '}\n\n'
+    # fast call entry _npcpp_fast_name: vector arguments as a plain pointer and size pair, see fast_function
+    kinds = [p['type']['kind'] for p in sig['params']]+[ret['kind']]
+    if ('fast' in wanted or 'out' in wanted) and 'ndarr' not in kinds and [k for k in kinds if k in ('vector', 'view', 'vect')]:
+        fast_params, fast_args = [], []
+        for j, p in enumerate(sig['params'], 1):
+            info = p['type']
+            if info['kind'] in ('vector', 'view', 'vect'):
+                fast_params += [info['elem']+'* npcpp_p%d' % j, 'size_t npcpp_n%d' % j]
+                fast_args.append('vect<%s>(npcpp_p%d, npcpp_n%d)' % (info['elem'], j, j))
+            else:
+                fast_params.append(info['cpp']+' '+p['name'])
+                fast_args.append(p['name'])
+        if 'fast' in wanted:
+            code += 'DLLEXPORT '+ext_type(ret)+' _npcpp_fast_'+sig['name']+'('+', '.join(fast_params)+')\n{\n'
+            code += '\treturn _'+sig['name']+'('+', '.join(fast_args)+');\n}\n\n'
+        # out= entry _npcpp_out_name: the function is called directly and writes into the caller's buffer,
+        # its full size is returned. An npcpp::vector result of the size of out is allocated in out itself
+        # (see out_scope) unless out overlaps an argument, other results are copied and freed right away
+        if 'out' in wanted and ret['kind'] in ('vector', 'vect'):
+            code += 'DLLEXPORT size_t _npcpp_out_'+sig['name']+'('+', '.join([ret['elem']+'* npcpp_out', 'size_t npcpp_out_n']+fast_params)+')\n{\n\tNPCPP_ENTER\n'
+            arrays = []
+            for j, p in enumerate(sig['params'], 1):
+                info = p['type']
+                if info['kind'] in ('vector', 'view', 'vect'):
+                    code += '\tvect<%s> %s(npcpp_p%d, npcpp_n%d);\n' % (info['elem'], p['name'], j, j)
+                    arrays.append('npcpp::overlaps(npcpp_out, npcpp_out_n*sizeof(*npcpp_out), npcpp_p%d, npcpp_n%d*sizeof(*npcpp_p%d))' % (j, j, j))
+            code += before+converted
+            direct = ret['cpp'].startswith('npcpp::') and ret['elem'] != 'bool' # std::vector<bool> has no data()
+            if direct:
+                code += '\tbool npcpp_alias = %s;\n' % (' || '.join(arrays) or 'false')
+                code += '\tnpcpp::out_scope npcpp_scope(npcpp_alias ? nullptr : npcpp_out, npcpp_out_n*sizeof(*npcpp_out));\n'
+            code += '\tauto npcpp_r = '+sig['qualname']+'('+', '.join(out_args)+');\n'+after
+            if ret['kind'] == 'vector':
+                if direct:
+                    code += '\tif (npcpp_r.data() != npcpp_out)\n\t'
+                code += '\tstd::copy(npcpp_r.begin(), npcpp_r.begin() + std::min(npcpp_r.size(), npcpp_out_n), npcpp_out);\n'
+                code += '\treturn npcpp_r.size();\n}\n\n'
+            else:
+                code += '\tstd::copy(npcpp_r.arr, npcpp_r.arr + std::min(npcpp_r.size, npcpp_out_n), npcpp_out);\n'
+                code += '\tif (npcpp_r.owner)\n\t\tnpcpp_r.release(npcpp_r.owner);\n'
+                code += '\treturn npcpp_r.size;\n}\n\n'
+    # batched entry _npcpp_batch_name of scalar exports, looping over arrays with a step 0 for broadcast arguments
+    ctypes_names = [translate(p['type']['key'])[0] for p in sig['params']]
+    if 'batch' in wanted and sig['params'] and translate(ret['key'])[0] in BATCH_CTYPES and \
+            all(t in BATCH_CTYPES and not p['type']['mutable_ref'] for t, p in zip(ctypes_names, sig['params'])):
+        batch_params, batch_args = ['size_t npcpp_n', ret['cpp']+'* npcpp_out'], []
+        for j, p in enumerate(sig['params'], 1):
+            batch_params += ['const %s* npcpp_x%d' % (p['type']['cpp'], j), 'size_t npcpp_s%d' % j]
+            batch_args.append('npcpp_x%d[i*npcpp_s%d]' % (j, j))
+        code += 'DLLEXPORT void _npcpp_batch_'+sig['name']+'('+', '.join(batch_params)+')\n{\n\tNPCPP_ENTER\n'
+        code += '\tfor (size_t i = 0; i < npcpp_n; ++i)\n'
+        code += '\t\tnpcpp_out[i] = '+sig['qualname']+'('+', '.join(batch_args)+');\n}\n\n'
+    if 'ufunc' in wanted or core_dims(sig) is not None:
+        code += ufunc_loop(sig)
+    # python argument names with defaults, C++ defaults without a python spelling make the argument required
+    pynames = []
+    defaults_ok = True
+    for p in reversed(sig['params']):
+        pname = p['name']+'_' if keyword.iskeyword(p['name']) else p['name']
+        pydef = py_default(p['default']) if (p['default'] is not None and defaults_ok) else None
+        if pydef is None:
+            defaults_ok = False
+            pynames.insert(0, pname)
+        else:
+            pynames.insert(0, pname+' = '+pydef)
+    if 'parallel' in sig['options']:
+        if not ((0 in vectors) or (0 in vects)) or not [j for j in vectors+vects+views if j>0]:
+            raise ValueError("Export option parallel of '%s' requires vector arguments and a vector return value." % sig['name'])
+    newcode = [sig['name'], translate(ret['key'])[0], translate([p['type']['key'] for p in sig['params']]),
+               pynames, vectors, vects, views, sig['options']+[e for e in entries if e not in sig['options']]]
+    return code, newcode
+
+def make_ext(name,sys_type=0,thread_control=True,ext=None,entries=()):#the main parsing function
+    """Write name_ext.cpp (or the file ext) with an extern "C" entry point for every export of name, returns their newcodes entries;
+    entries are the optional entry points generated for every export, see ENTRIES"""
+    if ext is None:
+        ext = os.path.splitext(name)[0]+"_ext.cpp"
+    with open(name, "r") as f:
+        text = f.read()
+    signatures = parse_exports_cached(text, name)
+    names = [sig['name'] for sig in signatures]
+    duplicates = set(n for n in names if names.count(n) > 1)
+    if duplicates:
+        raise ValueError("Functions exported more than once: %s" % ', '.join(sorted(duplicates)))
+    file = open(ext, "w")
+    # guarded, so the copy from a precompiled header (options={'pch': True}) takes precedence
+    file.write('#ifndef NPCPP_TEMPLATE\n#define NPCPP_TEMPLATE\n'+cppTemplate+'#endif\n')
     if sys_type==0:
         file.write('#define DLLEXPORT extern "C" __declspec(dllexport)\n')
     else:
         file.write('#define DLLEXPORT extern "C"\n')
-    file.write('#include "'+name+'"\n\n')
-    i=0
-    while i < len(data):
-        if data[i][0]!='#' and data[i].find("npcpp::export") != -1:
-            continues = False
-            vectors = []
-            vects = []
-            fargs = []
-            fargs_types = []
-            fargs_names = []
-            i+=1
-            fname = grabFuncName(data[i])
-            ftype = data[i].lstrip().split(' ')[0]
-            #fargs_types.append(ftype)
-            header = 'DLLEXPORT '+ftype+' _'+fname+'(\n'
-            if header.find('std::vector') != -1:
-                vectors.append(0)            
-                header = replace_all_types(header)
-            if header.find('vect<') != -1:#needed?
-                vects.append(0)           #needed?  
-            file.write(header)               
-            firstline = data[i]
-            #check if there are arguments
-            firstline = firstline.split('(')
-            if len(firstline) > 1: #both fname and argnames in 1 line
-                if len(firstline[1]) > 0 and firstline[1]!='\n': #longer line case
-                    firstline_args = firstline[1].replace('{', '').replace(')', '').split(',')
-                    if firstline_args[len(firstline_args )-1] == '\n':
-                        firstline_args = firstline_args[0:(len(firstline_args)-1)]
-                        continues = True
-                    elif ('\n' in firstline_args[len(firstline_args )-1]) and (')' not in firstline[1]):
-                        continues = True
-                    fargs.append(firstline_args)
-                    #for case when function line is 1-liner
-                    fargs=fargs[0] #newline as we had [list]
-                    for j in range(0,len(fargs)):
-                        altfarg = replace_all_types(fargs[j])
-                        file.write(altfarg)
-                        if j!=len(fargs)-1:
-                            file.write(',')
-                        elif continues:
-                            pass
-                        else:
-                            file.write('){')
-            if data[i].find(')') == -1:
-                while data[i].find(')') == -1: #loop for arguments here
-                    i+=1
-                    #data_i = data[i].split(')')
-                    #if len(data_i)==0:
-                        
-                    if data[i].lstrip().find(')') != 0:
-                        if continues:
-                            file.write(',')
-                            continues = False
-                        fargs.extend(do_argument_line(data[i],file))
-                file.write(')\n{\n')
-            if continues:
-                pass#file.write(',')
-                #continues = False
-            #special case for last argument, the one with ')'
-            if data[i].find(')') != -1:
-                if data[i].find('{') == -1: #if begin sign is not present move one extra
-                    i+=1
-                    #file.write('{\n')
-                if ftype.find('vector') != -1:
-                    file.write('\treturn vec2arr('+fname+'(')
-                else:
-                    file.write('\treturn '+fname+'(')
-                for j in range(0,len(fargs)):
-                    nz = fargs[j].split('=')
-                    z = nz[0].lstrip().split(' ')
-                    if len(nz)>1:
-                        val = ' = '+(str(nz[1]).strip().capitalize()).replace(')','').replace('\n','')
-                    else:
-                        val = ''
-                    argtype = z[0].replace('\t','')
-                    fargs_types.append(argtype)
-                    if len(z)>1:
-                        fargs_names.append(z[1]+val)
-                    else:
-                        fargs_names.append(z[0])
-                    if argtype.find('vector') != -1:                        
-                        arg = 'arr2vec('+z[1]+')'
-                        vectors.append(j+1)
-                    else:
-                        if len(z)>1:    
-                            arg = z[1]
-                        else:
-                            arg = z[0]
-                    if argtype.find('vect<') != -1:
-                        vects.append(j+1)
-                    if j==0:
-                        file.write(arg)
-                    else:
-                        file.write(', '+arg)
-                if ftype.find('vector') != -1:                        
-                    file.write('));\n')
-                else:
-                    file.write(');\n')                    
-                file.write('}\n')
-            newcodes.append([fname,translate(ftype)[0],translate(fargs_types),fargs_names,vectors,vects])
-        else:
-            i+=1
+    if os.path.dirname(os.path.abspath(ext)) == os.path.dirname(os.path.abspath(name)):
+        file.write('#include "'+os.path.basename(name)+'"\n\n')
+    else: # isolated build directory
+        file.write('#include "'+os.path.abspath(name).replace('\\', '/')+'"\n\n')
+    newcodes = []
+    for sig in signatures:
+        code, newcode = ext_function(sig, entries)
+        file.write(code)
+        newcodes.append(newcode)
+    # every module gets OpenMP thread control, unless the source exports these names itself
+    if thread_control and not [c for c in newcodes if c[0] in ('set_num_threads', 'get_num_threads')]:
+        file.write(threadsTemplate)
+        newcodes.append(['set_num_threads', 'None', ['c_int'], ['n'], [], [], [], []])
+        newcodes.append(['get_num_threads', 'c_int', [], [], [], [], [], []])
+    if thread_control:
+        file.write(ompTemplate)
+        file.write(releaseTemplate)
+        file.write(poolTemplate)
+        file.write(pgoTemplate)
     file.close()
     return newcodes
 
 def list2str(somelist):
     return '['+', '.join(somelist)+']'
 
+def has_out(codes):
+    """True when the export has an _npcpp_out_name entry (option out, vector result, no ndarr) and no argument called out"""
+    return 'out' in codes[7] and ((0 in codes[4]) or (0 in codes[5])) and not [t for t in codes[2]+[codes[1]] if t.startswith('ndarr')] and \
+        'out' not in [a.split('=')[0].strip() for a in codes[3]]
+
 def make_wrapper(filename,codes):
-    if (not codes[4]) and (not codes[5]):
+    if (not codes[4]) and (not codes[5]) and (not codes[6]):
         return codes[0]+' = wrap_function('+filename+', \'_'+codes[0]+'\', '+codes[1]+', '+list2str(codes[2])+')'
+    elif has_out(codes):
+        return codes[0]+'_ = wrap_function('+filename+', \'_'+codes[0]+'\', '+codes[1]+', '+list2str(codes[2])+')\n'+ \
+            codes[0]+'_out_ = out_call('+filename+', '+repr(codes)+')'
     else:
         return codes[0]+'_ = wrap_function('+filename+', \'_'+codes[0]+'\', '+codes[1]+', '+list2str(codes[2])+')'
 
-def np_wrap(arg_types,arguments,vectors,vects):
+def np_wrap(arg_types,arguments,vectors,vects,views=()):
     newcodes = []
     i=0
     for a in arguments:
         i+=1        
-        if (i in vectors) or (i in vects):
+        if i in views:
+            newcodes.append(arg_types[i-1]+'.asview('+a.split('=')[0]+')')
+        elif (i in vectors) or (i in vects):
             newcodes.append(arg_types[i-1]+'.fromnp('+a.split('=')[0]+')')
         else:#
             newcodes.append(a.split('=')[0])
     return ', '.join(newcodes)        
     
 def make_np_wrapper(codes):
+    if 'parallel' in codes[7]:
+        positions = sorted(set(j for j in codes[4]+codes[5]+codes[6] if j>0))
+        return 'def '+codes[0]+'('+', '.join(codes[3])+'):\n\treturn parallel_map('+codes[0]+'_, ('+', '.join(a.split('=')[0].strip() for a in codes[3])+',), '+str(positions)+', '+list2str(codes[2])+', '+codes[1]+')'
     if (0 in codes[4]) or (0 in codes[5]):
         end = '.tonp()'
     else:
         end = ''
-    return 'def '+codes[0]+'('+', '.join(codes[3])+'):\n\treturn '+codes[0]+'_('+np_wrap(codes[2],codes[3],codes[4],codes[5])+')'+end
+    if has_out(codes):
+        names = [a.split('=')[0].strip() for a in codes[3]]
+        return 'def '+codes[0]+'('+', '.join(codes[3]+['out=None'])+'):\n\tif out is not None:\n\t\treturn '+codes[0]+'_out_(('+''.join(n+', ' for n in names)+'), out)\n' + \
+            '\treturn '+codes[0]+'_('+np_wrap(codes[2],codes[3],codes[4],codes[5],codes[6])+')'+end
+    return 'def '+codes[0]+'('+', '.join(codes[3])+'):\n\treturn '+codes[0]+'_('+np_wrap(codes[2],codes[3],codes[4],codes[5],codes[6])+')'+end
 
 def getSystem():
     if sys.platform == "win32":
@@ -503,9 +2400,14 @@ def getSystem():
         sys_type=2
     return sys_type
 
-def cppFunction(code,alt_path=None):
+def cppFunction(code,alt_path=None,cache=True,profile='release',options=None):
+    """Build C++ code from a string, the export comment is added before the first function when missing
+
+    The code is saved as temp.cpp in a directory of the cache named by its hash, so concurrent calls do not
+    share files, headers are still found relative to the working directory
+    """
     lines = code.split('\n')
-    file = open("temp.cpp", "w")
+    text = ''
     header = True
     for l in lines:
         if l!='':
@@ -513,23 +2415,882 @@ def cppFunction(code,alt_path=None):
                 if l[0:15]=="//npcpp::export":
                     header = False
             if header and l[0]!='#' and l[0:2] not in ('/*',' *', '*/', '//'):
-                file.write("//npcpp::export\n")
+                text += "//npcpp::export\n"
                 header = False
-        file.write(l+'\n')
-    file.close()
-    return sourceCpp("temp.cpp",recompile=True,alt_path=alt_path)
+        text += l+'\n'
+    src_dir = os.path.join(CACHE_DIR, 'sources', hashlib.sha256(text.encode('utf-8')).hexdigest()[:32])
+    os.makedirs(src_dir, exist_ok=True)
+    name = os.path.join(src_dir, "temp.cpp")
+    if not os.path.isfile(name):
+        tmp = name+'.tmp'+str(os.getpid())+'_'+str(threading.get_ident())
+        with open(tmp, "w") as file:
+            file.write(text)
+        os.replace(tmp, name)
+    options = dict(options or {})
+    options['include_dirs'] = list(options.get('include_dirs') or [])+[os.getcwd()]
+    return sourceCpp(name,recompile=True,alt_path=alt_path,cache=cache,profile=profile,options=options)
 
-def sourceCpp(name,recompile=True,alt_path=None):
-    libname, proc = prepImport(name,recompile=recompile,alt_path=alt_path)
-    file_path = os.path.join("", libname+".py")
-    if proc==0:
-        return load_dynamic_module_from_file(file_path)
+_build_pool = []
+
+def _build_executor():
+    if not _build_pool:
+        _build_pool.append(concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1))
+    return _build_pool[0]
+
+async def acppFunction(code,alt_path=None,cache=True,profile='release',options=None):
+    """cppFunction for asyncio: the build runs on a thread pool (g++ in a subprocess), the event loop keeps running"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_build_executor(), functools.partial(
+        cppFunction, code, alt_path=alt_path, cache=cache, profile=profile, options=options))
+
+async def asourceCpp(name,recompile=True,alt_path=None,cache=True,profile='release',options=None):
+    """sourceCpp for asyncio, see acppFunction"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_build_executor(), functools.partial(
+        sourceCpp, name, recompile=recompile, alt_path=alt_path, cache=cache, profile=profile, options=options))
+
+def sourceCpp(name,recompile=True,alt_path=None,cache=True,profile='release',options=None):
+    return loadModule(name,recompile=recompile,alt_path=alt_path,cache=cache,profile=profile,options=options)
+
+def module_name(filename, newcodes):
+    #libname cannot be equal to any of imported functions, so if filename matches fname we extend
+    libname = os.path.basename(filename)
+    # cppFunction code is saved as sources/<hash>/temp.cpp, each snippet is registered under its own name
+    src_dir = os.path.dirname(os.path.abspath(filename))
+    if os.path.dirname(src_dir) == os.path.abspath(os.path.join(CACHE_DIR, 'sources')):
+        libname += '_'+os.path.basename(src_dir)[:16]
+    if libname in [c[0] for c in newcodes]:
+        libname = libname + '_lib'
+    return libname
+
+def loadModule(name,recompile=True,alt_path=None,cache=True,profile='release',options=None):
+    """Build name and return its wrappers as a module object created in memory, no .py file is written
+
+    The module is registered as sys.modules['npcpp.'+libname], a rebuild replaces the entry in one step.
+    Its build_report attribute holds the report of the build (see new_report), which also goes to the build hook
+    """
+    start = time.perf_counter()
+    report = new_report(name)
+    sys_type = getSystem()
+    filename = lib_basename(name)
+    opts = options or {}
+    def load(newcodes, libfile):
+        return build_module(module_name(filename, newcodes), libfile, newcodes, sys_type, opts.get('fast'), opts.get('ufunc'),
+                            opts.get('lazy'), opts.get('instrument'), report)
+    newcodes, proc, module = build_and_use(name, load, sys_type, recompile=recompile, alt_path=alt_path, cache=cache,
+                                           profile=profile, options=options, report=report)
+    if proc!=0:
+        report['phases']['total'] = time.perf_counter()-start
+        if BUILD['hook'] is not None:
+            BUILD['hook'](report)
+        errors = ['{file}:{line}: {message}'.format(**e) for e in report['errors'][:3]]
+        raise ValueError("Loading cannot happen as compilation was not successfull."+(' '+'; '.join(errors) if errors else ''))
+    report['phases']['total'] = time.perf_counter()-start
+    module.build_report = report
+    if BUILD['hook'] is not None:
+        BUILD['hook'](report)
+    return module
+
+def profile_store(key):
+    """Directory of the profile data recorded by pgo for the build with cache key"""
+    return os.path.join(CACHE_DIR, 'profiles', key)
+
+def profile_digest(path):
+    """Hash of the .gcda files in path, part of the cache key of builds using them"""
+    h = hashlib.sha256()
+    for f in sorted(os.listdir(path)):
+        if f.endswith('.gcda'):
+            h.update(f.encode('utf-8'))
+            h.update(file_digest(os.path.join(path, f)).encode('utf-8'))
+    return h.hexdigest()[:32]
+
+def pgo(name, workload=None, module=None, store=None, refresh=False, alt_path=None, profile='release', options=None):
+    """Profile guided build of name, returns the optimized module
+
+    An instrumented library (-fprofile-generate) is loaded and passed to workload(module), which should call it
+    on representative inputs, then name is rebuilt with -fprofile-use from the recorded profile data.
+    The data is kept in store, by default the profiles directory of the build cache under the cache key of
+    the build without profiling, and reused while source, flags and compiler stay the same, so the instrumented
+    build and the workload run once (or again with refresh). The functions of the optimized library replace
+    those of module (a loaded module of name) when given, so code holding that module uses them
+    """
+    sys_type = getSystem()
+    options = dict(options or {})
+    if store is None:
+        flags = build_flags(sys_type, profile, options)+link_flags(sys_type, profile, options)
+        store = profile_store(cache_key(name, sys_type, alt_path, flags))
+    recorded = os.path.isdir(store) and [f for f in os.listdir(store) if f.endswith('.gcda')]
+    if refresh or not recorded:
+        if workload is None:
+            raise ValueError("No profile data in %s, a workload is needed to record it." % store)
+        instrumented = loadModule(name, alt_path=alt_path, cache=False, profile=profile, options=dict(options, pgo='generate'))
+        work = os.path.dirname(instrumented.__file__)
+        for f in os.listdir(work): # gcov would add the counters of earlier runs
+            if f.endswith('.gcda'):
+                os.remove(os.path.join(work, f))
+        workload(instrumented)
+        getattr(instrumented, instrumented.__name__.split('.', 1)[1])._npcpp_gcov_dump()
+        tmp = store+'.tmp'+str(os.getpid())
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for f in os.listdir(work):
+            if f.endswith('.gcda'):
+                shutil.copyfile(os.path.join(work, f), os.path.join(tmp, f))
+        shutil.rmtree(store, ignore_errors=True)
+        os.rename(tmp, store)
+    optimized = loadModule(name, alt_path=alt_path, profile=profile, options=dict(options, pgo='use', pgo_profile=store))
+    if module is None:
+        return optimized
+    for k, v in vars(optimized).items():
+        if k != '__name__':
+            setattr(module, k, v)
+    return module
+
+_loaded = {}
+
+def loadlib_fresh(name, sys_type=None):
+    """loadlib which really loads a rebuilt library
+
+    dlopen of a path that is already open returns the old library, so when the file at the path changed
+    since it was loaded the new one is loaded from a private copy (removed right away except on Windows)
+    """
+    if sys_type is None:
+        sys_type = getSystem()
+    path = os.path.join(os.getcwd(), name+libext(sys_type))
+    st = os.stat(path)
+    ident = (st.st_dev, st.st_ino, st.st_size, st.st_mtime)
+    if _loaded.get(path, ident) == ident:
+        _loaded[path] = ident
+        return loadlib(name, sys_type)
+    tmp_dir = tempfile.mkdtemp(prefix='npcpp-')
+    tmp_path = os.path.join(tmp_dir, os.path.basename(path))
+    shutil.copyfile(path, tmp_path)
+    try:
+        out = ctypes.CDLL(tmp_path)
+    finally:
+        if sys_type!=0:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    _loaded[path] = ident
+    return out
+
+def ctype_of(typename):
+    """ctypes type (or vect structure) for a translated type name like 'c_double', 'POINTER(c_int)' or 'vectd'"""
+    if typename == 'None':
+        return None
+    m = re.match(r'^POINTER\((.*)\)$', typename)
+    if m:
+        return ctypes.POINTER(ctype_of(m.group(1)))
+    out = globals().get(typename)
+    if isinstance(out, type) and issubclass(out, (vect, ndarr)):
+        return out
+    out = getattr(ctypes, typename, None)
+    if out is None:
+        raise ValueError("Type '%s' has no ctypes equivalent, it cannot cross the Python boundary." % typename)
+    return out
+
+# fast calls copy returned vectors shorter than copy_below elements into a new array, which is
+# cheaper than the zero copy handover of vect2np for small results
+FAST = {'copy_below': 4096}
+
+class fast_vect(ctypes.Structure):
+    """vect<T> returned by a _npcpp_fast_name entry, read as plain integers"""
+    _fields_ = [('arr', ctypes.c_void_p), ('size', ctypes.c_size_t),
+                ('owner', ctypes.c_void_p), ('release', ctypes.c_void_p)]
+
+def buffer_address(a):
+    """Address of the data of a numpy array, cheaper than a.ctypes.data for writable arrays"""
+    try:
+        return ctypes.addressof(ctypes.c_char.from_buffer(a))
+    except (TypeError, ValueError): # read only or empty
+        return a.__array_interface__['data'][0]
+
+def fast_pointer(a, cls, strict, cache, keep):
+    """Address and size of the buffer passed for a vector argument, a converted copy is kept alive in keep
+
+    Arrays already of the right layout are remembered in cache (weakly), so passing the same buffer
+    again skips these checks; the entry is one tuple replaced at once, so calls from several threads
+    never see parts of different entries
+    """
+    if isinstance(a, np.ndarray) and a.dtype == cls._dtype and a.ndim == 1 and a.flags.c_contiguous:
+        out = (buffer_address(a), a.shape[0])
+        cache[0] = (weakref.ref(a), out, a.shape, a.dtype)
+        return out
+    if strict:
+        np2view(cls, a) # raises the TypeError/ValueError of views
+    a_c = np.ascontiguousarray(a, dtype=cls._dtype)
+    keep.append(a_c)
+    return (buffer_address(a_c), len(a_c))
+
+def fast_slots(code, argtypes):
+    """Per argument None for scalars or (structure class, strict view, pointer cache) for arrays,
+    and the ctypes argument types of the fast entries"""
+    slots, fast_argtypes = [], []
+    for j, t in enumerate(argtypes, 1):
+        if (j in code[4]) or (j in code[5]) or (j in code[6]):
+            slots.append((t, j in code[6], [None]))
+            fast_argtypes += [ctypes.c_void_p, ctypes.c_size_t]
+        else:
+            slots.append(None)
+            fast_argtypes.append(t)
+    return slots, fast_argtypes
+
+def fast_arguments(args, slots, keep):
+    """Arguments of a fast entry, arrays as address and size"""
+    cargs = []
+    for a, slot in zip(args, slots):
+        if slot is None:
+            cargs.append(a)
+            continue
+        entry = slot[2][0]
+        if entry is not None and entry[0]() is a and a.shape == entry[2] and a.dtype is entry[3]:
+            cargs += entry[1]
+        else:
+            cargs += fast_pointer(a, slot[0], slot[1], slot[2], keep)
+    return cargs
+
+def out_call(lib, code):
+    """Call of the _npcpp_out_name entry of a vector returning export, writing the result into a given
+    contiguous array out of the exact result size, or None when the export has no such entry"""
+    try:
+        func = getattr(lib, '_npcpp_out_'+code[0])
+    except AttributeError:
+        return None
+    slots, fast_argtypes = fast_slots(code, [ctype_of(t) for t in code[2]])
+    func.argtypes = [ctypes.c_void_p, ctypes.c_size_t]+fast_argtypes
+    func.restype = ctypes.c_size_t
+    dtype = ctype_of(code[1])._dtype
+    def call(args, out):
+        if not isinstance(out, np.ndarray) or out.dtype != dtype:
+            raise TypeError("out must be a numpy array of dtype %s, got %s" % (dtype, getattr(out, 'dtype', type(out).__name__)))
+        if not out.flags.c_contiguous or not out.flags.writeable:
+            raise ValueError("out must be a writeable contiguous array")
+        keep = []
+        n = func(buffer_address(out), out.size, *fast_arguments(args, slots, keep))
+        if n != out.size:
+            raise ValueError("Export '%s' returned %d elements, out has %d" % (code[0], n, out.size))
+        return out
+    return call
+
+def fast_call(lib, code, argtypes):
+    """Call of the _npcpp_fast_name entry of an export taking numpy arrays as pointer and size pairs,
+    without building vect structures, or None when the export has no such entry (ndarr arguments)"""
+    try:
+        func = getattr(lib, '_npcpp_fast_'+code[0])
+    except AttributeError:
+        return None
+    slots, func.argtypes = fast_slots(code, argtypes)
+    ret = result_type(lib, ctype_of(code[1]))
+    if (0 in code[4]) or (0 in code[5]):
+        func.restype = fast_vect
+        take = wrap_function(lib, '_npcpp_take', None, [ctypes.c_void_p]*2+[ctypes.c_size_t]+[ctypes.c_void_p]*2)
+        itemsize = ret._dtype.itemsize
     else:
-        raise ValueError("Loading cannot happen as compilation was not successfull.")
+        func.restype = ret
+        take = None
+    def call(args):
+        keep = []
+        res = func(*fast_arguments(args, slots, keep))
+        if take is None:
+            return res
+        n = res.size
+        if n >= FAST['copy_below'] and res.owner:
+            return ret(ctypes.cast(res.arr, ret._fields_[0][1]), n, res.owner, res.release).tonp()
+        out = np.empty(n, dtype=ret._dtype)
+        take(buffer_address(out), res.arr, n*itemsize, res.owner, res.release)
+        return out
+    return call
+
+def batch_call(lib, code, argtypes):
+    """Call of the _npcpp_batch_name entry of a scalar export over numpy arrays, with numpy broadcasting
+    of the arguments, or None when the export has no such entry"""
+    try:
+        func = getattr(lib, '_npcpp_batch_'+code[0])
+    except AttributeError:
+        return None
+    dtypes = [np.dtype(t) for t in argtypes]
+    out_dtype = np.dtype(ctype_of(code[1]))
+    func.argtypes = [ctypes.c_size_t, ctypes.c_void_p]+[ctypes.c_void_p, ctypes.c_size_t]*len(dtypes)
+    func.restype = None
+    def call(args):
+        arrays = [np.asarray(a, dtype=d) for a, d in zip(args, dtypes)]
+        shape = np.broadcast_shapes(*[a.shape for a in arrays])
+        out = np.empty(shape, dtype=out_dtype)
+        if out.size == 0:
+            return out
+        cargs = [out.size, buffer_address(out)]
+        for j, a in enumerate(arrays):
+            if a.size == 1: # broadcast scalar, read with step 0
+                arrays[j] = np.ascontiguousarray(a).reshape(1)
+                cargs += [buffer_address(arrays[j]), 0]
+            else:
+                arrays[j] = np.ascontiguousarray(np.broadcast_to(a, shape))
+                cargs += [buffer_address(arrays[j]), 1]
+        func(*cargs)
+        return out
+    return call
+
+_ufunc_api = []
+# numpy keeps pointers into the buffers (and the library) of every ufunc made by ufunc_from_loop without
+# holding a reference, ufuncs cannot be freed or given attributes, so the buffers stay here for good
+# (also across importlib.reload of npcpp)
+_ufunc_buffers = globals().get('_ufunc_buffers', [])
+
+def ufunc_from_loop(loop, types, nin, name, doc, signature=None):
+    """numpy ufunc (gufunc with a core signature) from the address of a compiled inner loop and the
+    numpy type numbers of its arguments, made by PyUFunc_FromFuncAndDataAndSignature of the numpy C API
+
+    Returns the ufunc and the ctypes objects which have to be kept alive as long as it is used, for
+    the whole process (see _ufunc_buffers) since nothing tells when numpy is done with it
+    """
+    if not _ufunc_api:
+        try:
+            from numpy._core import _multiarray_umath as umath
+        except ImportError: # numpy 1.x
+            from numpy.core import _multiarray_umath as umath
+        get_pointer = ctypes.pythonapi.PyCapsule_GetPointer
+        get_pointer.restype = ctypes.c_void_p
+        get_pointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
+        table = (ctypes.c_void_p*32).from_address(get_pointer(umath._UFUNC_API, None))
+        # entry 31 of the table is PyUFunc_FromFuncAndDataAndSignature, PYFUNCTYPE keeps the GIL during the call
+        _ufunc_api.append(ctypes.PYFUNCTYPE(ctypes.py_object, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int,
+                                            ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_char_p,
+                                            ctypes.c_int, ctypes.c_char_p)(table[31]))
+    keep = [(ctypes.c_void_p*1)(loop), (ctypes.c_void_p*1)(), ctypes.create_string_buffer(bytes(types), len(types)),
+            ctypes.create_string_buffer(name.encode()), ctypes.create_string_buffer(doc.encode()),
+            ctypes.create_string_buffer((signature or '').encode())]
+    # identity -1 (PyUFunc_None): reduce works, but only along one axis and not over empty arrays
+    out = _ufunc_api[0](ctypes.addressof(keep[0]), ctypes.addressof(keep[1]), keep[2], 1, nin, 1, -1,
+                        keep[3], keep[4], 0, keep[5] if signature else None)
+    return out, keep
+
+def make_ufunc(lib, code):
+    """numpy ufunc of an elementwise scalar export or gufunc of an export with the gufunc=<signature> option,
+    None when the library has no inner loop for it"""
+    try:
+        loop = ctypes.cast(getattr(lib, '_npcpp_ufunc_'+code[0]), ctypes.c_void_p).value
+    except AttributeError:
+        return None, None
+    types = []
+    for t in code[2]+[code[1]]:
+        t = ctype_of(t)
+        types.append((t._dtype if isinstance(t, type) and issubclass(t, vect) else np.dtype(t)).num)
+    signature = [o[len('gufunc='):] for o in code[7] if o.startswith('gufunc=')]
+    return ufunc_from_loop(loop, types, len(code[2]), code[0], 'npcpp export '+code[0], signature[0] if signature else None)
+
+# instrumented modules keep the latencies of the last samples calls of each export for the percentiles,
+# hook is called after every instrumented call, see set_stats_hook
+STATS = {'hook': None, 'samples': 10000}
 
-def prepImport(name,recompile=True,alt_path=None):
+def set_stats_hook(hook):
+    """hook(module_name, export, t_in, t_native, t_out, bytes_in, bytes_out) is called after every call of an export
+    of an instrumented module with the seconds spent converting arguments, in C++ and converting the result,
+    and the bytes copied on the way in and out; None removes it"""
+    STATS['hook'] = hook
+
+class CallStats(object):
+    """Call count, bytes copied and latencies split into marshalling in, native call and marshalling out
+    of one export of an instrumented module"""
+    phases = ('in', 'native', 'out')
+    def __init__(self, module_name, name):
+        self.module_name = module_name
+        self.name = name
+        self.lock = threading.Lock()
+        self.reset()
+    def reset(self):
+        self.calls = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.totals = [0.0, 0.0, 0.0]
+        self.samples = [collections.deque(maxlen=STATS['samples']) for _ in self.phases]
+    def record(self, t_in, t_native, t_out, bytes_in=0, bytes_out=0):
+        with self.lock:
+            self.calls += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            for k, t in enumerate((t_in, t_native, t_out)):
+                self.totals[k] += t
+                self.samples[k].append(t)
+        hook = STATS['hook']
+        if hook is not None:
+            hook(self.module_name, self.name, t_in, t_native, t_out, bytes_in, bytes_out)
+    def summary(self):
+        with self.lock:
+            out = {'calls': self.calls, 'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out}
+            for phase, total, samples in zip(self.phases, self.totals, self.samples):
+                q = np.percentile(samples, [50, 90, 99]) if samples else [0.0, 0.0, 0.0]
+                out[phase] = {'total': total, 'p50': float(q[0]), 'p90': float(q[1]), 'p99': float(q[2])}
+        return out
+
+def timed_call(f, stats, nbytes_out=None):
+    """f recording its whole run time as the native call in stats, for the call paths which convert
+    arguments in C++ (batched, parallel and out= calls)"""
+    perf_counter = time.perf_counter
+    def call(*args):
+        t = perf_counter()
+        res = f(*args)
+        t = perf_counter()-t
+        stats.record(0.0, t, 0.0, 0, nbytes_out(args, res) if nbytes_out is not None else 0)
+        return res
+    return call
+
+def make_function(lib, code, fast=False, stats=None):
+    """Python callable of an export from its newcodes entry: the ctypes function itself for scalar exports
+    without defaults or batched entry, otherwise a wrapper converting numpy arrays, plus the ctypes function
+
+    Scalar wrappers bind the C++ defaults and call the ctypes function, arguments ctypes rejects (numpy arrays,
+    lists) go to the batched entry, which is also the batch attribute. With fast (or the export option fast)
+    the wrapper calls the _npcpp_fast_name entry, see fast_call. With stats (a CallStats) every call is recorded
+    in it, vector exports then take the default path, whose phases can be timed separately
+    """
+    func = wrap_function(lib, '_'+code[0], ctype_of(code[1]), [ctype_of(t) for t in code[2]])
+    argtypes = [ctype_of(t) for t in code[2]]
+    scalar = (not code[4]) and (not code[5]) and (not code[6])
+    if scalar:
+        batch = batch_call(lib, code, argtypes)
+        if batch is None and stats is None and not [a for a in code[3] if '=' in a]:
+            return func, None
+    names = [a.split('=')[0].strip() for a in code[3]]
+    params = []
+    for a in code[3]:
+        if '=' in a:
+            params.append(inspect.Parameter(a.split('=')[0].strip(), inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                                            default=ast.literal_eval(a.split('=', 1)[1].strip())))
+        else:
+            params.append(inspect.Parameter(a.strip(), inspect.Parameter.POSITIONAL_OR_KEYWORD))
+    out_func = out_call(lib, code) if has_out(code) else None
+    if out_func is not None:
+        params.append(inspect.Parameter('out', inspect.Parameter.KEYWORD_ONLY, default=None))
+    signature = inspect.Signature(params)
+    defaults = tuple(p.default for p in params if p.default is not inspect.Parameter.empty and p.name != 'out')
+    required = len(names)-len(defaults)
+    def bind(args, kwargs):
+        """Positional arguments of a call, trailing defaults are filled in without inspect when possible"""
+        if kwargs or not required <= len(args) <= len(names):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return bound.args
+        return args+defaults[len(args)-required:]
+    if stats is not None and out_func is not None:
+        out_func = timed_call(out_func, stats, lambda args, res: res.nbytes)
+    def python_function(call):
+        """call(args) with the signature of the export, the keyword only out goes to out_func"""
+        def wrapper(*args, **kwargs):
+            out = kwargs.pop('out', None) if out_func is not None else None
+            if kwargs or len(args) != len(names):
+                args = bind(args, kwargs)
+            if out is not None:
+                return out_func(args, out)
+            return call(args)
+        wrapper.__name__ = code[0]
+        wrapper.__signature__ = signature
+        return wrapper
+    if scalar:
+        if batch is not None:
+            batch = python_function(batch if stats is None else timed_call(batch, stats))
+        single = func if stats is None else timed_call(func, stats)
+        def wrapper(*args, **kwargs):
+            if kwargs or len(args) != len(names):
+                args = bind(args, kwargs)
+            try: # the common case costs one ctypes call
+                return single(*args)
+            except ctypes.ArgumentError:
+                if batch is None:
+                    raise
+            return batch(*args)
+        wrapper.__name__ = code[0]
+        wrapper.__signature__ = signature
+        wrapper.batch = batch
+        return func, wrapper
+    if 'parallel' in code[7]:
+        positions = sorted(set(j for j in code[4]+code[5]+code[6] if j>0))
+        restype = ctype_of(code[1])
+        def call(args):
+            return parallel_map(func, args, positions, argtypes, restype)
+        if stats is not None:
+            call = timed_call(call, stats, lambda args, res: res.nbytes)
+    elif (fast or 'fast' in code[7]) and stats is None:
+        call = fast_call(lib, code, argtypes)
+    else:
+        call = None
+    if call is None:
+        # converters precomputed per argument: numpy arrays to structures, scalars as they are
+        converters = []
+        for j in range(1, len(names)+1):
+            if j in code[6]:
+                converters.append(argtypes[j-1].asview)
+            elif (j in code[4]) or (j in code[5]):
+                converters.append(argtypes[j-1].fromnp)
+            else:
+                converters.append(None)
+        tonp = (0 in code[4]) or (0 in code[5])
+        if stats is None:
+            def call(args):
+                res = func(*[conv(a) if conv is not None else a for conv, a in zip(converters, args)])
+                return res.tonp() if tonp else res
+        else:
+            copied = [j in code[4] for j in range(1, len(names)+1)] # std::vector arguments are copied by arr2vec
+            perf_counter = time.perf_counter
+            def call(args):
+                t0 = perf_counter()
+                cargs = [conv(a) if conv is not None else a for conv, a in zip(converters, args)]
+                t1 = perf_counter()
+                res = func(*cargs)
+                t2 = perf_counter()
+                owner = True
+                if tonp:
+                    owner = res.owner
+                    res = res.tonp()
+                t3 = perf_counter()
+                bytes_in = 0
+                for conv, a, c, vector in zip(converters, args, cargs, copied):
+                    if conv is not None:
+                        nbytes = c._numpy_ref.nbytes
+                        bytes_in += (nbytes if vector else 0)+(nbytes if c._numpy_ref is not a else 0)
+                stats.record(t1-t0, t2-t1, t3-t2, bytes_in, 0 if owner else res.nbytes)
+                return res
+    return func, python_function(call)
+
+benchmarkCode = """
+#include <numeric>
+double add(double a, double b) { return a + b; }
+//npcpp::export
+double total(npview<double> x) { return std::accumulate(x.begin(), x.end(), 0.0); }
+//npcpp::export fast
+double total_fast(npview<double> x) { return std::accumulate(x.begin(), x.end(), 0.0); }
+//npcpp::export
+std::vector<double> scale(std::vector<double> x, double k) { for (auto& v : x) v *= k; return x; }
+//npcpp::export fast
+std::vector<double> scale_fast(std::vector<double> x, double k) { for (auto& v : x) v *= k; return x; }
+"""
+
+def call_benchmark(size=10, number=100000, repeat=5, alt_path=None):
+    """Nanoseconds per call of small exports through the default wrappers and the fast call path
+
+    Builds benchmarkCode with cppFunction, size
+    is the length of the input array, the best of repeat timings of number calls is reported
+    """
+    import timeit
+    m = cppFunction(benchmarkCode, alt_path=alt_path)
+    x = np.arange(size, dtype=np.float64)
+    xv = vectd.fromnp(x)
+    cases = [('scalar ctypes', lambda: m.add_(1.0, 2.0)),
+             ('scalar', lambda: m.add(1.0, 2.0)),
+             ('view ctypes structure', lambda: m.total_(vectd.asview(x))),
+             ('view', lambda: m.total(x)),
+             ('view fast', lambda: m.total_fast(x)),
+             ('vector ctypes structure', lambda: m.scale_(xv, 2.0).tonp()),
+             ('vector', lambda: m.scale(x, 2.0)),
+             ('vector fast', lambda: m.scale_fast(x, 2.0))]
+    out = {}
+    for name, f in cases:
+        out[name] = min(timeit.repeat(f, number=number, repeat=repeat))/number*1e9
+    return out
+
+benchSuiteCode = """
+#include <cmath>
+#include <chrono>
+//npcpp::export
+std::vector<double> scale(npview<double> x, double k) { std::vector<double> o(x.begin(), x.end()); for (auto& v : o) v *= k; return o; }
+//npcpp::export
+std::vector<double> roundtrip(std::vector<double> x) { return x; }
+// seconds per arr2vec copy of x, timed in C++ (the empty asm keeps every copy from being optimized away)
+//npcpp::export
+double time_arr2vec(npview<double> x, int reps)
+{
+    vect<double> v(const_cast<double*>(x.data()), x.size());
+    auto t = std::chrono::steady_clock::now();
+    for (int i = 0; i < reps; ++i) {
+        std::vector<double> c = arr2vec(v);
+        asm volatile("" : : "r"(c.data()) : "memory");
+    }
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - t).count() / reps;
+}
+// seconds per vec2arr of a std::vector of the size of x, the vectors are made and released outside the timing
+//npcpp::export
+double time_vec2arr(npview<double> x, int reps)
+{
+    std::vector<std::vector<double>> vs(reps, std::vector<double>(x.begin(), x.end()));
+    std::vector<vect<double>> out(reps);
+    auto t = std::chrono::steady_clock::now();
+    for (int i = 0; i < reps; ++i)
+        out[i] = vec2arr(std::move(vs[i]));
+    double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - t).count() / reps;
+    for (vect<double>& r : out)
+        r.release(r.owner);
+    return seconds;
+}
+//npcpp::export parallel
+std::vector<double> heavy(npview<double> x) { std::vector<double> o(x.size()); for (size_t i = 0; i < x.size(); ++i) { double v = x[i]; for (int j = 0; j < 32; ++j) v = std::sqrt(v + j); o[i] = v; } return o; }
+"""
+
+BENCH_SIZES = (10, 10**3, 10**5, 10**6, 10**8)
+
+def bench_suite(sizes=BENCH_SIZES, threads=None, parallel_size=10**7, repeat=5, alt_path=None):
+    """Benchmarks of npcpp as a JSON serializable dict, times in seconds unless the name says otherwise
+
+    compile: build of benchSuiteCode without the cache and from the cache,
+    calls: nanoseconds per call of call_benchmark,
+    marshalling: per array size the conversions vect.fromnp, vect.asview and tonp of a returned std::vector,
+    next to the scale export and the same computation in numpy, and the std::vector marshalling of C++:
+    roundtrip (a std::vector<double> argument returned as it is), arr2vec (copy of an argument into a std::vector)
+    and vec2arr (handing a std::vector over to numpy), both timed in C++ by time_arr2vec and time_vec2arr,
+    threads: the parallel export heavy over parallel_size elements with 1, 2, 4 ... threads (up to threads,
+    default all cores). The best of repeat runs is reported everywhere
+    """
+    import timeit
+    def best(f, n=1):
+        return min(timeit.repeat(f, number=n, repeat=repeat))/n
+    out = {'environment': dict(bundle_tags(), cpus=os.cpu_count(), compiler=compiler_id(alt_path=alt_path))}
+    t = time.perf_counter()
+    m = cppFunction(benchSuiteCode, alt_path=alt_path, cache=False)
+    cold = time.perf_counter()-t
+    cppFunction(benchSuiteCode, alt_path=alt_path) # stores the cache entry
+    out['compile'] = {'cold': cold, 'cached': best(lambda: cppFunction(benchSuiteCode, alt_path=alt_path))}
+    out['calls'] = call_benchmark(alt_path=alt_path)
+    out['marshalling'] = {}
+    for size in sizes:
+        x = np.arange(size, dtype=np.float64)
+        n = max(1, 10**6 // size) # repeated calls to time small arrays above the timer resolution
+        times = []
+        for _ in range(repeat): # only n results exist at a time, tonp takes over their buffers
+            results = [m.scale_(vectd.asview(x), 2.0) for _ in range(n)]
+            t = time.perf_counter()
+            arrays = [r.tonp() for r in results]
+            times.append((time.perf_counter()-t)/n)
+            del results, arrays
+        reps = min(n, 1000) # time_vec2arr holds reps copies of x
+        out['marshalling'][str(size)] = {'fromnp': best(lambda: vectd.fromnp(x), n),
+                                         'asview': best(lambda: vectd.asview(x), n),
+                                         'tonp': min(times),
+                                         'scale': best(lambda: m.scale(x, 2.0), n),
+                                         'numpy': best(lambda: x*2.0, n),
+                                         'roundtrip': best(lambda: m.roundtrip(x), n),
+                                         'arr2vec': min(m.time_arr2vec(x, reps) for _ in range(repeat)),
+                                         'vec2arr': min(m.time_vec2arr(x, reps) for _ in range(repeat))}
+        del x
+    x = np.arange(parallel_size, dtype=np.float64)
+    saved = dict(PARALLEL)
+    out['threads'] = {}
+    try:
+        k = 1
+        while k <= (threads or os.cpu_count() or 1):
+            set_parallel(threads=k, min_size=1)
+            out['threads'][str(k)] = best(lambda: m.heavy(x))
+            k *= 2
+    finally:
+        PARALLEL.update(saved)
+    return out
+
+POOL_FIELDS = ('in_use', 'high_water', 'reserved', 'live', 'blocks')
+
+def pool_functions(lib):
+    """pool_stats, pool_reset and pool_reserve of the arena behind npcpp::vector in the library lib"""
+    stats_c = wrap_function(lib, '_npcpp_pool_stats', None, [ctypes.POINTER(ctypes.c_size_t)])
+    reset_c = wrap_function(lib, '_npcpp_pool_reset', ctypes.c_size_t, [ctypes.c_int])
+    reserve_c = wrap_function(lib, '_npcpp_pool_reserve', None, [ctypes.c_size_t])
+    def pool_stats():
+        """Bytes of the arena used since the last reset, their maximum since loading (high water mark), bytes reserved
+        in blocks, number of results still used by numpy arrays and number of blocks"""
+        out = (ctypes.c_size_t*len(POOL_FIELDS))()
+        stats_c(out)
+        return dict(zip(POOL_FIELDS, out))
+    def pool_reset(release=False):
+        """Make the whole arena available again between batches, release also frees its blocks;
+        ValueError while numpy arrays still use results allocated in it"""
+        live = reset_c(1 if release else 0)
+        if live:
+            raise ValueError("%d results allocated in the arena are still used by numpy arrays, delete them (or copy) before pool_reset." % live)
+    def pool_reserve(nbytes):
+        """Allocate arena blocks of nbytes in total up front"""
+        reserve_c(int(nbytes))
+    return pool_stats, pool_reset, pool_reserve
+
+def bind_export(module, lib, code, fast=False, ufunc=False, stats=None):
+    """Set the ctypes function and the wrapper (or ufunc) of the export code on module, calls are recorded
+    in stats (a CallStats) when given, except calls of ufuncs"""
+    func, wrapper = make_function(lib, code, fast, stats)
+    if wrapper is None:
+        setattr(module, code[0], func)
+    else:
+        setattr(module, code[0]+'_', func)
+        setattr(module, code[0], wrapper)
+    if ufunc or 'ufunc' in code[7] or [o for o in code[7] if o.startswith('gufunc=')]:
+        u, keep = make_ufunc(lib, code)
+        if u is not None:
+            setattr(module, code[0]+'_', func)
+            setattr(module, code[0], u)
+            _ufunc_buffers.append((lib, keep))
+            pin_library(lib) # for good, like the buffers
+
+def build_module(libname, libfile, newcodes, sys_type=None, fast=False, ufunc=False, lazy=False, instrument=False, report=None):
+    """Module object with the ctypes functions and numpy wrappers of the library libfile (name without extension)
+
+    With ufunc (or the export options ufunc and gufunc=<signature>) elementwise exports become numpy ufuncs.
+    With lazy each export is bound (symbol lookup, argtypes, wrapper) on first attribute access through
+    the module __getattr__, module.warmup() binds all that are left.
+    With instrument (or later module.instrument()) every call is recorded, module.stats() returns the counts,
+    bytes copied and latencies per export, see CallStats and set_stats_hook.
+    The times of loading the library and binding the exports go to the load and wrappers phases of report
+    """
+    t = time.perf_counter()
+    lib = loadlib_fresh(libfile, sys_type)
+    add_phase(report, 'load', time.perf_counter()-t)
+    module = types.ModuleType('npcpp.'+libname)
+    module.__file__ = os.path.join(os.getcwd(), libfile+libext(sys_type))
+    setattr(module, libname, lib)
+    module.handle = lib._handle
+    if hasattr(lib, '_npcpp_pool_stats'):
+        module.pool_stats, module.pool_reset, module.pool_reserve = pool_functions(lib)
+    pending = dict((code[0], code) for code in newcodes)
+    state = {'instrument': bool(instrument)}
+    module._stats = {}
+    def export_stats(name):
+        if not state['instrument']:
+            return None
+        if name not in module._stats:
+            module._stats[name] = CallStats(module.__name__, name)
+        return module._stats[name]
+    def bind(name):
+        code = pending.get(name)
+        if code is not None:
+            bind_export(module, lib, code, fast, ufunc, export_stats(name))
+            pending.pop(name, None)
+    def __getattr__(name):
+        bind(name[:-1] if name.endswith('_') and name[:-1] in pending else name)
+        try:
+            return module.__dict__[name]
+        except KeyError:
+            raise AttributeError("module '%s' has no attribute '%s'" % (module.__name__, name))
+    def __dir__():
+        return sorted(set(module.__dict__) | set(pending))
+    def warmup():
+        """Bind every export not accessed yet, returns the module"""
+        for name in list(pending):
+            bind(name)
+        return module
+    def instrument(on=True):
+        """Record the calls of every export (on) or go back to the uninstrumented wrappers, returns the module"""
+        state['instrument'] = bool(on)
+        for code in newcodes:
+            if code[0] not in pending:
+                bind_export(module, lib, code, fast, ufunc, export_stats(code[0]))
+        return module
+    def stats(reset=False):
+        """Summary of the recorded calls by export name (see CallStats.summary), reset clears them"""
+        out = dict((name, st.summary()) for name, st in module._stats.items())
+        if reset:
+            for st in module._stats.values():
+                st.reset()
+        return out
+    module.warmup = warmup
+    module.instrument = instrument
+    module.stats = stats
+    t = time.perf_counter()
+    if lazy:
+        module.__getattr__ = __getattr__
+        module.__dir__ = __dir__
+    else:
+        warmup()
+    add_phase(report, 'wrappers', time.perf_counter()-t)
+    sys.modules[module.__name__] = module # single assignment: the old module is replaced, never returned
+    return module
+
+BUNDLE_FILE = 'bundle.json'
+
+def bundle_tags():
+    """What a prebuilt bundle has to match to be loaded: platform, Python and NumPy versions and npcpp itself,
+    whose wrapper generation defines the format of the stored exports"""
+    if 'npcpp' not in _digests:
+        _digests['npcpp'] = file_digest(os.path.abspath(__file__))
+    return {'platform': sys.platform, 'machine': platform.machine(),
+            'python': '%d.%d' % sys.version_info[:2], 'numpy': np.__version__.split('.')[0],
+            'npcpp': _digests['npcpp']}
+
+def build_bundle(sources, out_dir, alt_path=None, cache=True, profile='release', options=None):
+    """Build every source (a .cpp file, a list of them or a directory, as for sourceCpp) ahead of time
+    into out_dir: the shared libraries plus bundle.json with the parsed exports, see load_bundle
+
+    Returns the path of bundle.json
+    """
     sys_type = getSystem()
-    filename = name.split('.')[0]
+    options = options or {}
+    flags = build_flags(sys_type, profile, options)
+    if cpu_specific_flags(flags):
+        raise ValueError("Bundles run on other machines, %s would make them fail with illegal instructions there; "
+                         "use a portable profile such as release (or an explicit -march=<baseline> in the flags option)."
+                         % ' '.join(cpu_specific_flags(flags)))
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    modules = []
+    for name in sources:
+        def copy(newcodes, libfile):
+            libname = module_name(lib_basename(name), newcodes)
+            if libname in [m['name'] for m in modules]:
+                raise ValueError("Two sources of the bundle give the module name %s" % libname)
+            shutil.copyfile(libfile+libext(sys_type), os.path.join(out_dir, libname+'_ext'+libext(sys_type)))
+            return libname
+        newcodes, proc, libname = build_and_use(name, copy, sys_type, alt_path=alt_path, cache=cache, profile=profile, options=options)
+        if proc!=0:
+            raise ValueError("Bundle cannot be built as compilation of %s was not successfull." % (name,))
+        source = [os.path.abspath(s) for s in name] if isinstance(name, (list, tuple)) else os.path.abspath(name)
+        modules.append({'name': libname, 'library': libname+'_ext', 'source': source, 'codes': newcodes,
+                        'fast': bool(options.get('fast')), 'ufunc': bool(options.get('ufunc'))})
+    meta = dict(bundle_tags(), profile=profile, options=options, compile_flags=flags, modules=modules)
+    path = os.path.join(out_dir, BUNDLE_FILE)
+    with open(path+'.tmp', 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(path+'.tmp', path)
+    return path
+
+def bundle_mismatch(meta):
+    """Reason why the bundle described by meta cannot be loaded here, None when it can"""
+    tags = bundle_tags()
+    for k in ('platform', 'machine', 'python', 'numpy', 'npcpp'):
+        if meta.get(k) != tags[k]:
+            return 'built for {0} {1}, this is {2}'.format(k, meta.get(k), tags[k])
+    native = cpu_specific_flags(meta.get('compile_flags') or [])
+    if native:
+        return 'built with {0} for the CPU of the build machine'.format(' '.join(native))
+    return None
+
+def cpu_specific_flags(flags):
+    """Flags generating instructions of the compiling CPU only, code built with them may crash with SIGILL elsewhere"""
+    return [f for f in flags if f in ('-march=native', '-mcpu=native', '-mnative')]
+
+def load_bundle(path, fallback=True, alt_path=None, lazy=False):
+    """Modules of a bundle made by build_bundle (or python -m npcpp build), as a dict by module name
+
+    The prebuilt libraries are attached from the stored exports, so no parsing and no compiler is involved.
+    When the bundle was built for another platform, Python, NumPy or npcpp version, the reason is written to
+    stderr and with fallback the recorded sources are compiled instead, otherwise ValueError is raised.
+    lazy binds the exports on first use, see build_module
+    """
+    sys_type = getSystem()
+    if os.path.isdir(path):
+        path = os.path.join(path, BUNDLE_FILE)
+    with open(path) as f:
+        meta = json.load(f)
+    folder = os.path.dirname(os.path.abspath(path))
+    reason = bundle_mismatch(meta)
+    out = {}
+    for m in meta['modules']:
+        libfile = os.path.join(folder, m['library'])
+        if reason is None and not os.path.isfile(libfile+libext(sys_type)):
+            reason = 'library {0} is missing'.format(m['library']+libext(sys_type))
+        if reason is None:
+            out[m['name']] = build_module(m['name'], libfile, m['codes'], sys_type, m['fast'], m['ufunc'], lazy)
+            continue
+        sources = m['source'] if isinstance(m['source'], list) else [m['source']]
+        if not fallback or not all(os.path.exists(s) for s in sources):
+            raise ValueError("Bundle {0} cannot be loaded: {1}".format(path, reason))
+        sys.stderr.write("Bundle {0} cannot be loaded ({1}), compiling {2} instead.\n".format(path, reason, m['name']))
+        out[m['name']] = loadModule(m['source'], alt_path=alt_path, profile=meta.get('profile', 'release'),
+                                    options=dict(meta.get('options') or {}, lazy=lazy))
+    return out
+
+def prepImport(name,recompile=True,alt_path=None,cache=True,profile='release',options=None):
+    sys_type = getSystem()
+    filename = lib_basename(name)
     if os.path.isfile(filename+"_ext.dll")==1:
         try:
             file = open(filename+"_handle_tmp.txt", "r") 
@@ -538,11 +3299,13 @@ def prepImport(name,recompile=True,alt_path=None):
             deloadlib(None,sys_type,handle)
         except:
             pass
-    newcodes = make_ext(name,sys_type)
-    if recompile:
-        proc = makelib(filename+"_ext",sys_type,alt_path=alt_path)
-    else:
-        proc = 0        
+    def copy(newcodes, libfile):
+        if os.path.abspath(libfile) != os.path.abspath(filename+"_ext"):
+            # the wrapper loads the library from next to the source
+            shutil.copyfile(libfile+libext(sys_type), filename+"_ext"+libext(sys_type)+'.tmp'+str(os.getpid()))
+            os.replace(filename+"_ext"+libext(sys_type)+'.tmp'+str(os.getpid()), filename+"_ext"+libext(sys_type))
+    newcodes, proc, _ = build_and_use(name, copy, sys_type, recompile=recompile, alt_path=alt_path, cache=cache,
+                                      profile=profile, options=options)
     fnames = [c[0] for c in newcodes]
     if filename in fnames:
         libname = filename + '_lib'    
@@ -558,7 +3321,7 @@ def prepImport(name,recompile=True,alt_path=None):
         file.write("handle = "+libname+"._handle\n")
         for code in newcodes:
             file.write(make_wrapper(libname,code)+'\n')
-            if code[4] or code[5]:
+            if code[4] or code[5] or code[6]:
                 file.write(make_np_wrapper(code)+'\n')
             #exec(code)
         file.write("file = open('"+filename+"_handle_tmp.txt', 'w')\n")
@@ -567,53 +3330,13 @@ def prepImport(name,recompile=True,alt_path=None):
         file.close()       
     return libname, proc
 
-#below sourceCpp version wraps on the fly instead of creating more files
-#loadAll and hence sourceCppSimple work in py2 normally and in py3 only when exported function doesnt have vector args and doesnt return vector
-def sourceCppSimple(name,recompile=True,alt_path=None):
-    return Namespace(**loadAll(name,recompile=recompile,alt_path=alt_path))
+#below sourceCpp version returns a plain namespace instead of a module
+def sourceCppSimple(name,recompile=True,alt_path=None,cache=True,profile='release',options=None):
+    return Namespace(**loadAll(name,recompile=recompile,alt_path=alt_path,cache=cache,profile=profile,options=options))
 
-def loadAll(name,recompile=True,alt_path=None):
-    sys_type = getSystem()
-    filename = name.split('.')[0]
-    if os.path.isfile(filename+"_ext.dll")==1:
-        try:
-            file = open(filename+"_handle_tmp.txt", "r") 
-            handle = int(file.read())
-            file.close()
-            deloadlib(None,sys_type,handle)
-        except:
-            pass    
-    newcodes = make_ext(name,sys_type)
-    if recompile:
-        proc = makelib(filename+"_ext",sys_type,alt_path=alt_path)
-    else:#success returns 0
-        proc = 0
-    #filename is going to be used as lib name in py, it cannot be equal to any of imported functions
-    fnames = [c[0] for c in newcodes]
-    if filename in fnames:
-        libname = filename + '_lib'    
-    else:
-        libname = filename
-    if proc==0:
-        libname_instance = loadlib(filename+"_ext",sys_type)
-        handle = libname_instance._handle
-        exec(libname+"=libname_instance")
-        del libname_instance
-        #exec(libname+" = loadlib('"+filename+"_ext',sys_type)")
-        #exec('handle = '+libname+'._handle')
-        for code in newcodes:
-            exec(make_wrapper(libname,code))
-            if code[4]:
-                exec(make_np_wrapper(code))
-        file = open(filename+"_handle_tmp.txt", "w")
-        try:
-            file.write(str(handle))
-        except:
-            pass
-        file.close()        
-    else:
-        raise ValueError("Loading cannot happen as compilation was not successfull.")
-    return locals()
+def loadAll(name,recompile=True,alt_path=None,cache=True,profile='release',options=None):
+    module = loadModule(name,recompile=recompile,alt_path=alt_path,cache=cache,profile=profile,options=options).warmup()
+    return dict((k, v) for k, v in vars(module).items() if not k.startswith('__'))
 
 class Namespace(object):
     """
@@ -640,23 +3363,23 @@ def load_dynamic_module_from_file(file_path):
     # We'll use the base name without extension, e.g., 'dynamic_module_advanced_sim_config'
     module_name = os.path.splitext(os.path.basename(file_path))[0]
 
-    # Check if module is already loaded to prevent redundant loading
+    # a module loaded before is replaced, as the library behind it may have been rebuilt
     if module_name in sys.modules:
-        sys.stdout.write("Module '%s' already loaded. Returning updated instance.\\n" % module_name)
-        return sys.modules[module_name]
+        sys.stdout.write("Module '%s' already loaded. Reloading it.\n" % module_name)
+        del sys.modules[module_name]
 
     try:
         # imp.load_source(name, pathname) is the Python 2 way to load
         # a module from a specific file path.
         # It executes the file and returns the module object.
         # It also adds the module to sys.modules.
-        sys.stdout.write("Loading dynamic module '%s' from '%s'...\\n" % (module_name, file_path))
+        sys.stdout.write("Loading dynamic module '%s' from '%s'...\n" % (module_name, file_path))
         dynamic_module = importlib.machinery.SourceFileLoader(module_name, file_path).load_module()
         #dynamic_module = imp.load_source(module_name, file_path)
-        sys.stdout.write("Successfully loaded dynamic module '%s'.\\n" % module_name)
+        sys.stdout.write("Successfully loaded dynamic module '%s'.\n" % module_name)
         return dynamic_module
     except Exception as e:
-        sys.stderr.write("Error loading dynamic module from '%s': %s\\n" % (file_path, e))
+        sys.stderr.write("Error loading dynamic module from '%s': %s\n" % (file_path, e))
         raise
 
 #
@@ -667,11 +3390,11 @@ def load_dynamic_module_from_file(file_path):
 # 2. the preferred type of vectors for C++ in vectorized function cases is std::vector<> which is mapped into numpy array
 # 3. it is possible to compile file also with types such as vect<> struct internally created in this packages
 # or C array (like double*), but the latter is not recommended as it requires further tweaks after wrapping the function,
-# 4. all variable types that are compatible are types written as 1 word, exception is long long type, in case of pointers it should also be 1 word, e.g. int*.
+# 4. compatible types are C++ scalar types (also multi word ones like unsigned long long), pointers to them, and std::vector<>, npview<>, std::span<> and ndarr<> of them, const and references are allowed.
 # 5. if compilation is done on cpp file then all exported functions should have
 # before their first line a meta-comment containing 'npcpp::export'
-# 6. arguments definitions in C++ code are expected to be either all in the same line as function name,
-# or they should be separated by new line signs, i.e. each argument in a separate line.
+# 6. exported functions may be declared in any layout: arguments over several lines, comments, namespaces, default arguments
+# (simple literal defaults become defaults of the python wrapper), a non const std::vector<>& argument is copied back into the numpy array.
 #
 # USE EXAMPLE:
 #
@@ -728,5 +3451,46 @@ def load_dynamic_module_from_file(file_path):
 #
 # npcpp.deloadlib(hofstadterq)
 #
-# # npcpp.cpp function saves cpp code from string into temp.cpp in the same folder
-#
\ No newline at end of file
+# # npcpp.cppFunction saves cpp code from string into temp.cpp in its own directory of the build cache
+#
+def main(argv=None):
+    """Command line: python -m npcpp build a.cpp b.cpp -o bundle/ [--profile release] [--compiler path] [--options json]
+    or python -m npcpp bench [--sizes 10,1000] [--threads 8] [--repeat 5] [-o results.json]
+
+    The build profiles exclude native, bundles run on other machines (see build_bundle)"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='npcpp')
+    commands = parser.add_subparsers(dest='command')
+    build = commands.add_parser('build', help='build sources ahead of time into a bundle for load_bundle')
+    build.add_argument('sources', nargs='+', help='.cpp files or directories of them, one module each')
+    build.add_argument('-o', '--output', default='bundle', help='bundle directory')
+    build.add_argument('--profile', default='release', choices=sorted(p for p in PROFILES if not cpu_specific_flags(PROFILES[p])))
+    build.add_argument('--compiler', default=None, help='path of the compiler bin folder (Windows)')
+    build.add_argument('--options', default=None, help='build options as a JSON object, e.g. {"openmp": true}')
+    bench = commands.add_parser('bench', help='run bench_suite and write its results as JSON')
+    bench.add_argument('--sizes', default=','.join(str(s) for s in BENCH_SIZES), help='comma separated array sizes')
+    bench.add_argument('--threads', type=int, default=None, help='largest number of threads of the scaling runs')
+    bench.add_argument('--repeat', type=int, default=5)
+    bench.add_argument('--compiler', default=None, help='path of the compiler bin folder (Windows)')
+    bench.add_argument('-o', '--output', default=None, help='JSON file, standard output by default')
+    args = parser.parse_args(argv)
+    if args.command == 'bench':
+        res = bench_suite([int(float(s)) for s in args.sizes.split(',')], threads=args.threads,
+                          repeat=args.repeat, alt_path=args.compiler)
+        if args.output is None:
+            json.dump(res, sys.stdout, indent=1)
+            sys.stdout.write('\n')
+        else:
+            with open(args.output, 'w') as f:
+                json.dump(res, f, indent=1)
+        return 0
+    if args.command != 'build':
+        parser.print_help()
+        return 2
+    options = json.loads(args.options) if args.options else None
+    path = build_bundle(args.sources, args.output, alt_path=args.compiler, profile=args.profile, options=options)
+    sys.stdout.write("Bundle written to %s\n" % path)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
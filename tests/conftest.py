@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import npcpp
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Empty working directory with a private build cache"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(npcpp, 'CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import npcpp
+
+CODE = """
+//npcpp::export
+npcpp::vector<double> ramp(int n) { npcpp::vector<double> out(n); for (int i = 0; i < n; i++) out[i] = i; return out; }
+//npcpp::export
+double total(npcpp::vector<double> x) { npcpp::vector<double> tmp(x.begin(), x.end()); double s = 0; for (double v : tmp) s += v; return s; }
+"""
+
+
+def test_results_live_in_the_arena(workdir):
+    m = npcpp.cppFunction(CODE)
+    a = m.ramp(1000)
+    assert np.array_equal(a, np.arange(1000.0))
+    stats = m.pool_stats()
+    assert stats['live'] == 1 and stats['in_use'] >= a.nbytes and stats['blocks'] >= 1
+    with pytest.raises(ValueError, match='still used by numpy arrays'):
+        m.pool_reset()
+    b = a.copy()
+    del a
+    assert m.pool_stats()['live'] == 0
+    m.pool_reset()
+    assert m.pool_stats()['in_use'] == 0 and m.pool_stats()['high_water'] >= b.nbytes
+    assert np.array_equal(m.ramp(1000), b) # the memory is used again
+
+
+def test_scratch_space_is_rewound(workdir):
+    m = npcpp.cppFunction(CODE)
+    for _ in range(3):
+        assert m.total(np.arange(100.0)) == 4950.0
+    assert m.pool_stats()['in_use'] == 0 and m.pool_stats()['live'] == 0
+
+
+def test_reserve_and_release(workdir):
+    m = npcpp.cppFunction(CODE)
+    m.pool_reserve(1 << 20)
+    stats = m.pool_stats()
+    assert stats['reserved'] >= 1 << 20 and stats['in_use'] == 0
+    m.ramp(1000)
+    assert m.pool_stats()['blocks'] == stats['blocks'] # taken from the reserved blocks
+    m.pool_reset(release=True)
+    assert m.pool_stats()['reserved'] == 0 and m.pool_stats()['blocks'] == 0
@@ -0,0 +1,11 @@
+import numpy as np
+
+import npcpp
+
+
+def test_marshalling_is_timed_in_cpp(workdir):
+    m = npcpp.cppFunction(npcpp.benchSuiteCode)
+    x = np.arange(10.0)
+    assert m.time_arr2vec(x, 100) > 0.0
+    assert m.time_vec2arr(x, 100) > 0.0
+    assert np.array_equal(m.roundtrip(x), x)
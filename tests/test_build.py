@@ -0,0 +1,95 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import npcpp
+
+
+def test_missing_compiler_fails_the_build(workdir, monkeypatch):
+    monkeypatch.setattr(npcpp, 'compiler_env', lambda sys_type=None, alt_path=None: ('/nonexistent/g++', None))
+    with pytest.raises(ValueError, match='cannot run the compiler'):
+        npcpp.cppFunction("double f() { return 1.0; }", cache=False)
+
+
+OMP_CODE = "int threads() { int n = 0;\n#pragma omp parallel\n{\n#pragma omp single\nn = omp_get_num_threads();\n}\nreturn n; }"
+
+
+def test_thread_count_applies_to_every_thread(workdir):
+    m = npcpp.cppFunction(OMP_CODE, options={'openmp': True})
+    n = (os.cpu_count() or 1)+1 # differs from the OpenMP default
+    m.set_num_threads(n)
+    assert m.get_num_threads() == n
+    counts = []
+    t = threading.Thread(target=lambda: counts.append(m.threads()))
+    t.start()
+    t.join()
+    assert counts == [n]
+    assert m.threads() == n
+
+
+def test_pch_adds_no_headers(workdir):
+    # <numeric> is not part of the template, code relying on it builds neither with nor without the pch
+    code = "double total(npview<double> x) { return std::accumulate(x.begin(), x.end(), 0.0); }"
+    for options in ({}, {'pch': True}):
+        with pytest.raises(ValueError):
+            npcpp.cppFunction(code, options=options)
+    m = npcpp.cppFunction("#include <numeric>\n"+code, options={'pch': True})
+    assert m.total(np.arange(4.0)) == 6.0
+
+
+def test_profile_flags():
+    flags = npcpp.build_flags(1, 'debug', {'fast_math': True, 'defines': {'NSIM': 1000, 'FLAG': None}, 'flags': ['-Wextra']})
+    assert flags == ['-fPIC', '-O0', '-g', '-ffast-math', '-DFLAG', '-DNSIM=1000', '-Wextra']
+    assert npcpp.link_flags(1, 'debug', {'libs': ['m'], 'lib_dirs': ['lib']}) == ['-shared', '-Llib', '-lm']
+    with pytest.raises(ValueError, match='Unknown build profile'):
+        npcpp.build_flags(1, 'fastest')
+
+
+def test_profiles_are_separate_builds(workdir):
+    with open('sim.cpp', 'w') as f:
+        f.write("//npcpp::export\nint nsim() { return NSIM; }\n")
+    debug = npcpp.compiler(profile='debug', options={'defines': {'NSIM': 10}}).sourceCpp('sim.cpp')
+    assert debug.nsim() == 10 and debug.build_report['cache'] == 'miss'
+    info = npcpp.build_info('sim.cpp')
+    assert info['profile'] == 'debug' and '-O0' in info['compile_flags'] and '-DNSIM=10' in info['compile_flags']
+    release = npcpp.sourceCpp('sim.cpp', options={'defines': {'NSIM': 20}})
+    assert release.nsim() == 20 and release.build_report['cache'] == 'miss'
+    assert npcpp.build_info('sim.cpp')['profile'] == 'release'
+    assert npcpp.compiler(profile='debug', options={'defines': {'NSIM': 10}}).sourceCpp('sim.cpp').build_report['cache'] == 'hit'
+    assert npcpp.build_info('sim.cpp')['profile'] == 'debug'
+
+
+def test_build_report(workdir, monkeypatch):
+    reports = []
+    monkeypatch.setitem(npcpp.BUILD, 'hook', reports.append)
+    with open('f.cpp', 'w') as f:
+        f.write("//npcpp::export\ndouble f(double x) { int unused = 0; return x; }\n")
+    m = npcpp.sourceCpp('f.cpp', options={'flags': ['-Wall']})
+    r = m.build_report
+    assert reports == [r] and r['cache'] == 'miss' and r['exit_code'] == 0
+    assert {'parse', 'compile', 'link', 'load', 'wrappers', 'total'} <= set(r['phases'])
+    assert r['commands'] and [c['exit_code'] for c in r['commands']] == [0]*len(r['commands'])
+    assert [w for w in r['warnings'] if 'unused' in w['message'] and w['file'].endswith('f.cpp') and w['line'] == 2]
+    hit = npcpp.sourceCpp('f.cpp', options={'flags': ['-Wall']}).build_report
+    assert hit['cache'] == 'hit' and hit['key'] == r['key'] and hit['commands'] == []
+    assert 'compile' not in hit['phases'] and 'load' in hit['phases']
+    assert npcpp.sourceCpp('f.cpp', cache=False, options={'flags': ['-Wall']}).build_report['cache'] == 'disabled'
+
+
+def test_failed_build_report(workdir, monkeypatch):
+    reports = []
+    monkeypatch.setitem(npcpp.BUILD, 'hook', reports.append)
+    with open('f.cpp', 'w') as f:
+        f.write("//npcpp::export\ndouble f(double x)\n{\n    return y;\n}\n")
+    with pytest.raises(ValueError, match='f.cpp:4: .*y'):
+        npcpp.sourceCpp('f.cpp')
+    r = reports[-1]
+    assert r['exit_code'] != 0 and r['commands'][-1]['exit_code'] != 0
+    assert [e for e in r['errors'] if e['file'].endswith('f.cpp') and e['line'] == 4 and e['column'] == 12]
+
+
+def test_time_report(workdir):
+    m = npcpp.cppFunction("double f(double x) { return x; }", options={'time_report': True})
+    assert 'TOTAL' in m.build_report['time_report']
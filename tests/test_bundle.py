@@ -0,0 +1,32 @@
+import pytest
+
+import npcpp
+
+CODE = "//npcpp::export\ndouble twice(double x) { return 2*x; }\n"
+
+
+def test_bundle_roundtrip(workdir):
+    (workdir / 'k.cpp').write_text(CODE)
+    npcpp.build_bundle(['k.cpp'], 'bundle', options={'flags': ['-march=x86-64']} if npcpp.platform.machine() == 'x86_64' else None)
+    assert npcpp.load_bundle('bundle', fallback=False)['k'].twice(2.0) == 4.0
+
+
+def test_native_bundles_are_rejected(workdir):
+    (workdir / 'k.cpp').write_text(CODE)
+    with pytest.raises(ValueError, match='-march=native'):
+        npcpp.build_bundle(['k.cpp'], 'bundle', profile='native')
+    with pytest.raises(ValueError, match='-march=native'):
+        npcpp.build_bundle(['k.cpp'], 'bundle', options={'flags': ['-march=native']})
+
+
+def test_native_bundle_mismatch():
+    meta = dict(npcpp.bundle_tags(), compile_flags=['-fPIC', '-O3', '-march=native'])
+    assert 'march=native' in npcpp.bundle_mismatch(meta)
+    assert npcpp.bundle_mismatch(dict(meta, compile_flags=['-O3'])) is None
+
+
+def test_command_line_profiles(workdir):
+    (workdir / 'k.cpp').write_text(CODE)
+    with pytest.raises(SystemExit):
+        npcpp.main(['build', 'k.cpp', '--profile', 'native'])
+    assert 'native' not in npcpp.main.__doc__.split('profiles')[0]
@@ -0,0 +1,111 @@
+import os
+
+import npcpp
+
+CODE = """
+#include "k.h"
+double k() { return K; }
+"""
+
+
+def test_cwd_header_edit_rebuilds(workdir):
+    (workdir / 'k.h').write_text('#define K 1.0\n')
+    assert npcpp.cppFunction(CODE).k() == 1.0
+    (workdir / 'k.h').write_text('#define K 2.0\n')
+    assert npcpp.cppFunction(CODE).k() == 2.0
+
+
+def test_include_dir_header_edit_rebuilds(workdir):
+    inc = workdir / 'inc'
+    inc.mkdir()
+    (inc / 'k.h').write_text('#define K 1.0\n')
+    options = {'include_dirs': [str(inc)]}
+    assert npcpp.cppFunction(CODE, options=options).k() == 1.0
+    (inc / 'k.h').write_text('#define K 2.0\n')
+    assert npcpp.cppFunction(CODE, options=options).k() == 2.0
+
+
+def test_include_dirs_parsed_from_flags():
+    assert npcpp.include_dirs(['-O3', '-Ia', '-I', 'b', '-Wall']) == ['a', 'b']
+
+
+def listing(workdir, sub):
+    path = workdir / 'cache' / sub
+    return sorted(p.name for p in path.iterdir()) if path.exists() else []
+
+
+def test_eviction_removes_build_leftovers(workdir, monkeypatch):
+    monkeypatch.setattr(npcpp, 'CACHE_GRACE', 0)
+    npcpp.cppFunction("double one() { return 1.0; }", cache=False)
+    npcpp.cppFunction("double two() { return 2.0; }")
+    assert listing(workdir, 'builds') and listing(workdir, 'sources')
+    leftovers = sum(1 for sub in ('builds', 'sources') for name in listing(workdir, sub))
+    assert npcpp.evict_cache(0) >= leftovers
+    assert listing(workdir, 'builds') == [] and listing(workdir, 'sources') == []
+    assert npcpp.cache_info()['entries'] == []
+
+
+def test_eviction_keeps_running_build(workdir, monkeypatch):
+    monkeypatch.setattr(npcpp, 'CACHE_GRACE', 0)
+    work = npcpp.build_dir('running')
+    os.makedirs(work)
+    with npcpp.file_lock(work+'.lock'):
+        npcpp.evict_cache(0)
+        assert os.path.isdir(work)
+    npcpp.evict_cache(0)
+    assert not os.path.exists(work) and not os.path.exists(work+'.lock')
+
+
+def test_eviction_waits_for_loading(workdir):
+    npcpp.cppFunction("double three() { return 3.0; }")
+    with npcpp.cache_lock(shared=True):
+        assert npcpp.evict_cache(0, wait=False) == 0
+        assert len(npcpp.cache_info()['entries']) == 1
+    assert npcpp.evict_cache(0) == 1
+
+
+def test_cached_objects_and_pch_outlive_eviction(workdir):
+    src = workdir / 'src'
+    src.mkdir()
+    (src / 'a.cpp').write_text('//npcpp::export\ndouble fa() { return 1.0; }\n')
+    (src / 'b.cpp').write_text('//npcpp::export\ndouble fb() { return 2.0; }\n')
+    options = {'pch': True}
+    m = npcpp.sourceCpp(str(src), options=options)
+    assert (m.fa(), m.fb()) == (1.0, 2.0)
+    (src / 'b.cpp').write_text('//npcpp::export\ndouble fb() { return 3.0; }\n')
+    m = npcpp.sourceCpp(str(src), options=options) # a.o and the header from the cache
+    assert (m.fa(), m.fb()) == (1.0, 3.0)
+    assert m.build_report['exit_code'] == 0
+
+
+def compiled(report):
+    return sorted(os.path.basename(c['args'][c['args'].index('-c')+1]) for c in report['commands'] if '-c' in c['args'])
+
+
+def test_pch_objects_are_reused(workdir):
+    src = workdir / 'src'
+    src.mkdir()
+    (src / 'a.cpp').write_text('//npcpp::export\ndouble fa() { return 1.0; }\n')
+    (src / 'b.cpp').write_text('//npcpp::export\ndouble fb() { return 2.0; }\n')
+    options = {'pch': True}
+    npcpp.sourceCpp(str(src), options=options)
+    (src / 'a.cpp').write_text('//npcpp::export\ndouble fa() { return 3.0; }\n')
+    m = npcpp.sourceCpp(str(src), options=options)
+    assert (m.fa(), m.fb()) == (3.0, 2.0)
+    assert compiled(m.build_report) == ['0_a_ext.cpp']
+
+
+def test_evicted_library_is_rebuilt_without_the_lock(workdir, monkeypatch):
+    build_ext = npcpp.build_ext
+    calls = []
+    def evicting_build(*args, **kwargs):
+        with npcpp.cache_lock(wait=False): # raises BlockingIOError while the shared lock is held
+            pass
+        newcodes, proc, libfile = build_ext(*args, **kwargs)
+        calls.append(libfile)
+        if len(calls) == 1: # another process evicts the entry before it is used
+            npcpp.purge_cache(os.path.basename(os.path.dirname(libfile)))
+        return newcodes, proc, libfile
+    monkeypatch.setattr(npcpp, 'build_ext', evicting_build)
+    assert npcpp.cppFunction("double four() { return 4.0; }").four() == 4.0
+    assert len(calls) == 2
@@ -0,0 +1,169 @@
+import ctypes
+import sys
+
+import numpy as np
+import pytest
+
+import npcpp
+
+CODE = "double power(double x, int n = 2) { double r = 1; for (int i = 0; i < n; i++) r *= x; return r; }"
+
+
+def test_scalar_export_binds_defaults(workdir):
+    m = npcpp.cppFunction(CODE)
+    assert m.power(3.0) == 9.0
+    assert m.power(2.0, n=3) == 8.0
+    assert isinstance(m.power_, ctypes._CFuncPtr)
+
+
+def test_scalar_export_dispatches_arrays(workdir):
+    m = npcpp.cppFunction(CODE, options={'batch': True})
+    x = np.arange(4.0)
+    assert np.array_equal(m.power(x), x**2)
+    assert np.array_equal(m.power(x[:, None], np.arange(3)), x[:, None]**np.arange(3))
+    assert np.array_equal(m.power([1.0, 2.0], 3), [1.0, 8.0])
+
+
+def test_plain_scalar_export_is_the_ctypes_function(workdir):
+    m = npcpp.cppFunction("double one() { return 1.0; }")
+    assert isinstance(m.one, ctypes._CFuncPtr)
+
+
+def test_batch_attribute(workdir):
+    m = npcpp.cppFunction(CODE, options={'batch': True})
+    x = np.arange(4.0)
+    assert np.array_equal(m.power.batch(x), x**2)
+    assert np.array_equal(m.power.batch(x[:, None], np.arange(3)), x[:, None]**np.arange(3))
+    assert np.array_equal(m.power.batch([1.0, 2.0], n=3), [1.0, 8.0])
+
+
+def test_instrumented_scalar_export(workdir):
+    m = npcpp.cppFunction(CODE, options={'instrument': True, 'batch': True})
+    assert m.power(2.0, 3) == 8.0
+    assert np.array_equal(m.power.batch(np.ones(5)), np.ones(5))
+    assert m.stats()['power']['calls'] == 2
+
+
+OUT_CODE = """
+//npcpp::export out
+npcpp::vector<double> scale(npview<double> x, double k) { npcpp::vector<double> r(x.size()); for (size_t i = 0; i < x.size(); i++) r[i] = x[i]*k; return r; }
+//npcpp::export out
+std::vector<double> increment(std::vector<double>& x) { for (double& v : x) v += 1; return x; }
+"""
+
+
+def test_out_writes_into_the_buffer(workdir):
+    m = npcpp.cppFunction(OUT_CODE)
+    x, buf = np.arange(100.0), np.empty(100)
+    for _ in range(10):
+        assert m.scale(x, 2.0, out=buf) is buf
+    assert np.array_equal(buf, 2*x)
+    # the result is built in buf, nothing is taken from the arena or left to numpy
+    assert m.pool_stats()['high_water'] == 0 and m.pool_stats()['live'] == 0
+    y = x.copy()
+    m.scale(y, 3.0, out=y) # overlapping, built in the arena and copied
+    assert np.array_equal(y, 3*x) and m.pool_stats()['in_use'] == 0
+    y = x.copy()
+    m.increment(y, out=buf)
+    assert np.array_equal(y, x+1) and np.array_equal(buf, x+1)
+
+
+class Interrupting(np.ndarray):
+    """Array running another call while its dtype is checked, as a thread switching in there would"""
+    def __array_finalize__(self, obj):
+        self.interrupt = None
+    @property
+    def dtype(self):
+        interrupt, self.interrupt = self.interrupt, None
+        if interrupt is not None:
+            interrupt()
+        return np.ndarray.dtype.__get__(self)
+
+
+def test_out_pointer_cache_is_consistent(workdir):
+    m = npcpp.cppFunction("std::vector<double> twice(npview<double> x) { std::vector<double> r(x.size()); for (size_t i = 0; i < x.size(); i++) r[i] = 2*x[i]; return r; }",
+                          options={'out': True})
+    x, buf = np.ones(10).view(Interrupting), np.empty(10)
+    y, other = np.full(20, 3.0), np.empty(20)
+    m.twice(x, out=buf) # remembered in the pointer cache
+    x.interrupt = lambda: m.twice(y, out=other)
+    m.twice(x, out=buf)
+    assert np.array_equal(buf, np.full(10, 2.0)) and np.array_equal(other, np.full(20, 6.0))
+
+
+INPLACE_CODE = "void bump(std::vector<double>& x) { for (double& v : x) v += 1; }"
+
+
+def test_inplace_argument_is_updated(workdir):
+    for options in ({}, {'fast': True}):
+        m = npcpp.cppFunction(INPLACE_CODE, options=options)
+        x = np.zeros(4)
+        m.bump(x)
+        assert np.array_equal(x, np.ones(4))
+
+
+def test_entries_are_generated_on_request(workdir):
+    code = "//npcpp::export\n"+CODE+"\n//npcpp::export\nstd::vector<double> twice(npview<double> x) { return std::vector<double>(x.begin(), x.end()); }"
+    m = npcpp.cppFunction(code)
+    lib = getattr(m, m.__name__.split('.')[-1])
+    for entry in npcpp.ENTRIES:
+        assert not [f for f in ('power', 'twice') if hasattr(lib, '_npcpp_%s_%s' % (entry, f))]
+    with pytest.raises(ctypes.ArgumentError):
+        m.power(np.arange(3.0))
+    with pytest.raises(TypeError):
+        m.twice(np.ones(3), out=np.empty(3))
+    m = npcpp.cppFunction(code, options=dict.fromkeys(npcpp.ENTRIES, True))
+    lib = getattr(m, m.__name__.split('.')[-1])
+    assert hasattr(lib, '_npcpp_batch_power') and hasattr(lib, '_npcpp_ufunc_power')
+    assert hasattr(lib, '_npcpp_fast_twice') and hasattr(lib, '_npcpp_out_twice')
+
+
+def test_inplace_argument_is_not_copied(workdir):
+    m = npcpp.cppFunction(INPLACE_CODE)
+    with pytest.raises(TypeError):
+        m.bump(np.zeros(4, dtype=np.float32))
+    with pytest.raises(ValueError):
+        m.bump(np.zeros(8)[::2])
+
+
+def test_unsigned_long_vectors(workdir):
+    m = npcpp.cppFunction("""
+std::vector<unsigned long> twice(const std::vector<unsigned long int>& x) { std::vector<unsigned long> r(x.begin(), x.end()); for (auto& v : r) v *= 2; return r; }
+""")
+    x = np.arange(5, dtype=np.dtype(ctypes.c_ulong))
+    res = m.twice(x)
+    assert res.dtype == x.dtype and np.array_equal(res, 2*x)
+
+
+def test_snippets_get_their_own_modules(workdir):
+    m1 = npcpp.cppFunction("double one() { return 1.0; }")
+    m2 = npcpp.cppFunction("double two() { return 2.0; }")
+    assert m1.__name__ != m2.__name__
+    assert sys.modules[m1.__name__] is m1 and sys.modules[m2.__name__] is m2
+    assert npcpp.cppFunction("double one() { return 1.0; }").__name__ == m1.__name__
+
+
+VIEW_CODE = """
+#include <span>
+//npcpp::export
+size_t address(npview<double> x) { return (size_t)x.data(); }
+//npcpp::export
+void zero(std::span<float> x) { for (float& v : x) v = 0; }
+"""
+
+
+def test_view_arguments_are_the_caller_buffer(workdir):
+    m = npcpp.cppFunction(VIEW_CODE, options={'flags': ['-std=c++20']})
+    x = np.arange(10.0)
+    assert m.address(x) == x.ctypes.data and m.address(x[2:]) == x.ctypes.data+16
+    y = np.ones(4, dtype=np.float32)
+    m.zero(y)
+    assert not y.any()
+    for a, error in ((np.arange(10), TypeError), ([1.0, 2.0], TypeError), (x[::2], ValueError), (np.zeros((2, 2)), ValueError)):
+        with pytest.raises(error):
+            m.address(a)
+
+
+def test_views_cannot_be_returned(workdir):
+    with pytest.raises(ValueError, match='cannot return a view'):
+        npcpp.cppFunction("npview<double> same(npview<double> x) { return x; }")
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import npcpp
+
+CODE = """
+//npcpp::export
+std::vector<double> scale(npview<double> x, double k) { std::vector<double> r(x.begin(), x.end()); for (double& v : r) v *= k; return r; }
+//npcpp::export
+double twice(double x) { return 2*x; }
+"""
+
+
+def test_exports_are_bound_on_first_access(workdir):
+    m = npcpp.cppFunction(CODE, options={'lazy': True})
+    assert 'scale' not in vars(m) and 'twice' not in vars(m)
+    assert {'scale', 'twice'} <= set(dir(m))
+    assert np.array_equal(m.scale(np.ones(3), 2.0), np.full(3, 2.0))
+    assert 'scale_' in vars(m) and 'twice' not in vars(m)
+    with pytest.raises(AttributeError):
+        m.missing
+    assert m.warmup() is m and m.twice(2.0) == 4.0 and 'twice' in vars(m)
+
+
+def test_modules_without_lazy_are_bound(workdir):
+    m = npcpp.cppFunction(CODE)
+    assert 'scale' in vars(m) and 'twice' in vars(m)
+    assert m.warmup() is m
+
+
+def test_lazy_bundle(workdir):
+    with open('kernels.cpp', 'w') as f:
+        f.write(CODE)
+    npcpp.build_bundle(['kernels.cpp'], 'bundle')
+    m = npcpp.load_bundle('bundle', lazy=True)['kernels']
+    assert 'twice' not in vars(m) and m.twice(1.5) == 3.0
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import npcpp
+
+CODE = """
+//npcpp::export
+ndarr<double> transpose(ndarr<double> a)
+{
+    ndarr<double> out = ndarr<double>::zeros({a.shape[1], a.shape[0]});
+    for (size_t i = 0; i < a.shape[0]; ++i)
+        for (size_t j = 0; j < a.shape[1]; ++j)
+            out(j, i) = a(i, j);
+    return out;
+}
+//npcpp::export
+void label(ndarr<double> a) { for (size_t i = 0; i < a.shape[0]; ++i) for (size_t j = 0; j < a.shape[1]; ++j) a(i, j) = 10*i+j; }
+"""
+
+LABELS = 10*np.arange(3)[:, None]+np.arange(4)
+
+
+def test_layouts_are_passed_as_they_are(workdir):
+    m = npcpp.cppFunction(CODE)
+    base = np.zeros((6, 12))
+    for a in (np.zeros((3, 4)), np.zeros((3, 4), order='F'), base[::2, ::3], base[::-2, 1::3], np.zeros((4, 3)).T):
+        m.label(a)
+        assert np.array_equal(a, LABELS) # written through the strides, so no copy was made
+    assert np.count_nonzero(base) == 2*11 # the elements of both slices but their label 0
+
+
+def test_results_are_c_ordered(workdir):
+    m = npcpp.cppFunction(CODE)
+    a = np.asfortranarray(LABELS.astype(np.float64))
+    res = m.transpose(a[:, ::2])
+    assert res.flags.c_contiguous and np.array_equal(res, LABELS[:, ::2].T)
+    assert np.array_equal(m.transpose(LABELS), LABELS.T) # converted to float64
+
+
+def test_dimension_limit(workdir):
+    m = npcpp.cppFunction(CODE)
+    with pytest.raises(ValueError, match='at most 8'):
+        m.transpose(np.zeros((1,)*9))
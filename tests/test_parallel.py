@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import npcpp
+
+CODE = """
+#include <chrono>
+#include <functional>
+#include <thread>
+//npcpp::export parallel
+std::vector<double> chunk_sizes(npview<double> x) { return std::vector<double>(x.size(), (double)x.size()); }
+//npcpp::export parallel
+std::vector<double> thread_ids(npview<double> x)
+{
+    std::this_thread::sleep_for(std::chrono::milliseconds(50)); // keeps every chunk on a thread of its own
+    return std::vector<double>(x.size(), (double)(std::hash<std::thread::id>()(std::this_thread::get_id()) % 1000003));
+}
+//npcpp::export parallel
+std::vector<double> first(npview<double> x) { return std::vector<double>(1, x[0]); }
+"""
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    for k, v in npcpp.PARALLEL.items():
+        monkeypatch.setitem(npcpp.PARALLEL, k, v)
+    return npcpp.set_parallel
+
+
+def test_inputs_are_split_into_chunks(workdir, parallel):
+    m = npcpp.cppFunction(CODE)
+    parallel(threads=4, chunk_size=3, min_size=0)
+    assert np.array_equal(m.chunk_sizes(np.zeros(10)), [3]*9+[1])
+    parallel(min_size=100) # below min_size the call runs serially
+    assert np.array_equal(m.chunk_sizes(np.zeros(10)), [10]*10)
+
+
+def test_chunks_run_on_the_configured_threads(workdir, parallel):
+    m = npcpp.cppFunction(CODE)
+    parallel(threads=4, min_size=0)
+    assert len(set(m.thread_ids(np.zeros(8)))) == 4
+    parallel(threads=1)
+    assert len(set(m.thread_ids(np.zeros(8)))) == 1
+
+
+def test_results_must_be_elementwise(workdir, parallel):
+    m = npcpp.cppFunction(CODE)
+    parallel(threads=2, min_size=0)
+    with pytest.raises(ValueError, match='one element per input element'):
+        m.first(np.arange(10.0))
+
+
+def test_parallel_needs_vectors(workdir):
+    with pytest.raises(ValueError, match='requires vector arguments'):
+        npcpp.cppFunction("//npcpp::export parallel\ndouble twice(double x) { return 2*x; }")
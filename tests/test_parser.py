@@ -0,0 +1,60 @@
+import pytest
+
+import npcpp
+
+
+def params(sig):
+    return [(p['name'], p['type']['key'], p['default']) for p in sig['params']]
+
+
+# source after the export comment, name, return type key, [(parameter name, type key, default)]
+CASES = [
+    ('double total(double x[], int n)',
+     'total', 'double', [('x', 'double*', None), ('n', 'int', None)]),
+    ('double first(const double x[10])',
+     'first', 'double', [('x', 'double*', None)]),
+    ('double sum(double[], int)',
+     'sum', 'double', [('arg0', 'double*', None), ('arg1', 'int', None)]),
+    ('double norm(const std::vector<double>& x)',
+     'norm', 'double', [('x', 'vect<double>', None)]),
+    ('void fill(std::vector<double> &out, double v)',
+     'fill', 'void', [('out', 'vect<double>', None), ('v', 'double', None)]),
+    ('double lookup(std::map<int, double> m, int k)',
+     'lookup', 'double', [('m', 'std::map<int,double>', None), ('k', 'int', None)]),
+    ('std::vector<std::complex<double>> fft(std::vector<std::complex<double>> x)',
+     'fft', 'vect<std::complex<double>>', [('x', 'vect<std::complex<double>>', None)]),
+    ('double power(double x, int n = 2, double scale = -1.5e3, bool check = true)',
+     'power', 'double', [('x', 'double', None), ('n', 'int', '2'), ('scale', 'double', '-1.5e3'), ('check', 'bool', 'true')]),
+    ('double pick(std::vector<int> idx = std::vector<int>{1, 2}, int n = f(1, 2))',
+     'pick', 'double', [('idx', 'vect<int>', 'std::vector<int>{1, 2}'), ('n', 'int', 'f(1, 2)')]),
+    ('std::vector<double>\n  scale(\n    std::vector<double> x,\n    double k\n  )',
+     'scale', 'vect<double>', [('x', 'vect<double>', None), ('k', 'double', None)]),
+    ('double /* result */ dot(npview<double> /* a */ a, // first\n npview<const double> b /* second */)',
+     'dot', 'double', [('a', 'vect<double>', None), ('b', 'vect<double>', None)]),
+    ('unsigned long long int count(long long n, unsigned char c)',
+     'count', 'uint64_t', [('n', 'longlong', None), ('c', 'uint8_t', None)]),
+    ('inline static double ns_free(void)',
+     'ns_free', 'double', []),
+    ('auto later(int n) -> std::vector<int>',
+     'later', 'vect<int>', [('n', 'int', None)]),
+]
+
+
+@pytest.mark.parametrize('source, name, ret, expected', CASES, ids=[c[1] for c in CASES])
+def test_parse_declaration(source, name, ret, expected):
+    sig, = npcpp.parse_exports('//npcpp::export\n'+source+' { }\n')
+    assert sig['name'] == name
+    assert sig['ret']['key'] == ret
+    assert params(sig) == expected
+
+
+def test_qualified_names():
+    sig, = npcpp.parse_exports('namespace a { namespace b {\n//npcpp::export\ndouble f(double x) { return x; }\n} }')
+    assert sig['qualname'] == 'a::b::f'
+
+
+def test_parse_errors():
+    with pytest.raises(ValueError, match='Templates cannot be exported'):
+        npcpp.parse_exports('//npcpp::export\ntemplate<typename T> T f(T x) { return x; }')
+    with pytest.raises(ValueError, match='Variadic'):
+        npcpp.parse_exports('//npcpp::export\nint f(int n, ...) { return n; }')
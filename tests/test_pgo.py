@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+import npcpp
+
+CODE = """
+//npcpp::export
+double total(npview<double> x) { double s = 0; for (size_t i = 0; i < x.size(); ++i) s += x[i] > 0.5 ? x[i] : -x[i]; return s; }
+"""
+
+
+def commands(module):
+    return ' '.join(' '.join(c['args']) for c in module.build_report['commands'])
+
+
+def test_profile_is_recorded_once(workdir):
+    with open('sim.cpp', 'w') as f:
+        f.write(CODE)
+    x = np.random.rand(1000)
+    runs = []
+    def workload(mod):
+        runs.append(mod)
+        mod.total(x)
+    m = npcpp.sourceCpp('sim.cpp')
+    assert npcpp.pgo('sim.cpp', workload, module=m) is m
+    assert len(runs) == 1 and '-fprofile-generate' in commands(runs[0])
+    assert '-fprofile-use' in commands(m) and m.total(x) == pytest.approx(np.where(x > 0.5, x, -x).sum())
+    # reused while source and flags are unchanged, refresh records it again
+    npcpp.pgo('sim.cpp', workload)
+    assert len(runs) == 1
+    npcpp.pgo('sim.cpp', workload, refresh=True)
+    assert len(runs) == 2
+
+
+def test_stored_profile_needs_no_workload(workdir):
+    with open('sim.cpp', 'w') as f:
+        f.write(CODE)
+    with pytest.raises(ValueError, match='a workload is needed'):
+        npcpp.pgo('sim.cpp', store='profile')
+    npcpp.pgo('sim.cpp', lambda mod: mod.total(np.ones(10)), store='profile')
+    assert [f for f in os.listdir('profile') if f.endswith('.gcda')]
+    m = npcpp.pgo('sim.cpp', store='profile')
+    assert m.total(np.ones(10)) == 10.0
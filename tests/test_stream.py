@@ -0,0 +1,22 @@
+import numpy as np
+
+import npcpp
+
+
+def pairs(x):
+    return np.stack([x, 2*x], axis=1)
+
+
+def test_raw_output_keeps_the_row_shape(workdir):
+    x = np.arange(10.0)
+    x.tofile('x.bin')
+    res = npcpp.stream(None, pairs, 'x.bin', out='pairs.bin', chunk_size=3, dtype=np.float64)
+    assert res.shape == (10, 2)
+    assert np.array_equal(res, pairs(x))
+
+
+def test_npy_output(workdir):
+    x = np.arange(10.0)
+    np.save('x.npy', x)
+    res = npcpp.stream(None, pairs, 'x.npy', out='pairs.npy', chunk_size=4)
+    assert np.array_equal(res, pairs(x))
@@ -0,0 +1,28 @@
+import ctypes
+import gc
+import sys
+
+import numpy as np
+
+import npcpp
+
+CODE = """
+//npcpp::export ufunc
+double hypot2(double a, double b) { return a*a + b*b; }
+"""
+
+
+def test_ufunc_outlives_module(workdir):
+    m = npcpp.cppFunction(CODE)
+    f = m.hypot2
+    assert isinstance(f, np.ufunc)
+    # rebuilding replaces the module in sys.modules, nothing else refers to the old one
+    npcpp.cppFunction(CODE.replace('a*a', '2*a*a'))
+    sys.modules.pop(m.__name__, None)
+    del m
+    gc.collect()
+    # reuse the memory of anything the ufunc would still point into
+    junk = [ctypes.create_string_buffer(b'\xff'*64) for i in range(10000)]
+    junk += [(ctypes.c_void_p*1)(12345) for i in range(10000)]
+    assert np.allclose(f(np.array([1.0, 2.0]), 3.0), [10.0, 13.0])
+    assert f(3.0, 4.0) == 25.0
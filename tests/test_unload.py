@@ -0,0 +1,52 @@
+import gc
+import os
+
+import numpy as np
+import pytest
+
+import npcpp
+
+CODE = """
+std::vector<double> ramp(int n) { std::vector<double> out(n); for (int i = 0; i < n; i++) out[i] = i; return out; }
+"""
+
+
+def test_array_defers_unload(workdir, capsys):
+    m = npcpp.cppFunction(CODE)
+    a = m.ramp(100000)
+    view = a[::2]
+    del a
+    npcpp.deloadlib(m)
+    assert 'still used by 1 numpy arrays' in capsys.readouterr().out
+    assert m.handle in npcpp._pinned
+    assert view[-1] == 99998.0
+    del view
+    gc.collect()
+    assert m.handle not in npcpp._pinned
+
+
+def test_ufunc_keeps_library(workdir, capsys):
+    m = npcpp.cppFunction("double twice(double x) { return 2*x; }", options={'ufunc': True})
+    npcpp.deloadlib(m)
+    assert 'still used' in capsys.readouterr().out
+    assert np.array_equal(m.twice(np.arange(3.0)), [0.0, 2.0, 4.0])
+
+
+def mapped(lib):
+    with open('/proc/self/maps') as f:
+        return lib._name in f.read()
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason='needs /proc/self/maps')
+def test_library_is_unmapped(workdir):
+    m = npcpp.cppFunction("""
+npcpp::vector<double> ones(int n) { return npcpp::vector<double>(n, 1.0); }
+""")
+    lib = getattr(m, m.__name__.split('.', 1)[1])
+    a = m.ones(10)
+    assert a.sum() == 10.0
+    npcpp.deloadlib(m)
+    assert mapped(lib)
+    del a
+    gc.collect()
+    assert not mapped(lib)